@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+
+"""
+Direct vs. overlap-add convolution crossover
+============================================
+
+Times `oceans.filters.convolve` with `method='direct'` and
+`method='fft'` for growing kernel lengths and reports the shortest kernel
+for which the FFT overlap-add is faster.  That length is the default for
+`_DIRECT_MAX_TAPS`, used by `method='auto'`.
+
+Run with::
+
+    python benchmarks/bench_convolve.py [npoints] [nchannels]
+
+"""
+
+from __future__ import (absolute_import, division, print_function)
+
+import sys
+import timeit
+
+import numpy as np
+
+from oceans.filters import convolve
+from oceans.filters.filters import _DIRECT_MAX_TAPS
+
+
+def best_time(func, repeat=5):
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+def main(npoints=10**6, nchannels=1):
+    x = np.random.randn(nchannels, npoints).squeeze()
+    print('{:>8} {:>12} {:>12}'.format('taps', 'direct (s)', 'fft (s)'))
+    crossover = None
+    for ntaps in 2 ** np.arange(2, 14) + 1:
+        kernel = np.random.randn(ntaps)
+        direct = best_time(lambda: convolve(x, kernel, method='direct'))
+        fft = best_time(lambda: convolve(x, kernel, method='fft'))
+        print('{:8d} {:12.5f} {:12.5f}'.format(ntaps, direct, fft))
+        if crossover is None and fft < direct:
+            crossover = ntaps
+    print('FFT overlap-add is faster from {} taps '
+          '(_DIRECT_MAX_TAPS = {}).'.format(crossover, _DIRECT_MAX_TAPS))
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+
+# numba is optional, its kernels are not collected without it.
+collect_ignore = []
+try:
+    import numba  # noqa
+except ImportError:
+    collect_ignore.append('oceans/filters/_jit.py')
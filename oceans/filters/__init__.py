@@ -1,23 +1,65 @@
 # -*- coding: utf-8 -*-
 
 from .filters import (
+    boxcar,
+    convolve,
+    gapfilter,
+    kernel_cache_clear,
+    kernel_cache_info,
     lanc,
+    lanc_decimate,
     smoo1,
     smoo2,
+    smoo2_tiled,
     weim,
     medfilt1,
+    medfilt2,
     fft_lowpass,
+    fft_filterbank,
+    frequency_response,
+    get_engine,
+    godin,
     md_trenberth,
-    pl33tn
+    pl33tn,
+    set_engine,
+)
+from .streaming import (
+    CausalMean,
+    CausalMedian,
+    CausalWeim,
+    StreamingFilter,
+    StreamingLanczos,
+    StreamingPL33,
+    StreamingTrenberth,
 )
 
 __all__ = [
+    'boxcar',
+    'convolve',
+    'gapfilter',
+    'kernel_cache_clear',
+    'kernel_cache_info',
     'lanc',
+    'lanc_decimate',
     'smoo1',
     'smoo2',
+    'smoo2_tiled',
     'weim',
     'medfilt1',
+    'medfilt2',
     'fft_lowpass',
+    'fft_filterbank',
+    'frequency_response',
+    'get_engine',
+    'godin',
     'md_trenberth',
     'pl33tn',
+    'set_engine',
+    'CausalMean',
+    'CausalMedian',
+    'CausalWeim',
+    'StreamingFilter',
+    'StreamingLanczos',
+    'StreamingPL33',
+    'StreamingTrenberth',
     ]
@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""
+numba kernels behind `engine='numba'` in `oceans.filters`.  Importing this
+module fails without numba, and `oceans.filters` then uses NumPy instead.
+
+All the kernels work on C-contiguous arrays with the filtered axis last
+and run their outer loop in parallel over the rows (series).
+
+"""
+
+from __future__ import (absolute_import, division, print_function)
+
+import numpy as np
+from numba import njit, prange
+
+
+@njit(parallel=True, cache=True)
+def separable_convolution(data, valid, wr, wc, out):
+    """
+    Normalized convolution of the 2D `data` with the window
+    `np.outer(wr, wc)`, counting only the `valid` points, like
+    `_separable_convolution`.
+
+    """
+    imax, jmax = data.shape
+    hr, hc = len(wr) // 2, len(wc) // 2
+    num = np.zeros((imax, jmax), out.dtype)
+    den = np.zeros((imax, jmax), out.dtype)
+
+    # Pass along the columns.
+    for i in prange(imax):
+        for k in range(len(wr)):
+            ii = i + k - hr
+            if ii < 0 or ii >= imax:
+                continue
+            w = wr[k]
+            for j in range(jmax):
+                if valid[ii, j]:
+                    num[i, j] += w * data[ii, j]
+                    den[i, j] += w
+
+    # Pass along the rows.
+    for i in prange(imax):
+        for j in range(jmax):
+            s = 0.
+            d = 0.
+            for k in range(max(0, hc - j), min(len(wc), jmax + hc - j)):
+                s += wc[k] * num[i, j + k - hc]
+                d += wc[k] * den[i, j + k - hc]
+            out[i, j] = s / d if d != 0 else np.nan
+
+
+@njit(parallel=True, cache=True)
+def normalized_rows(x, valid, w, out):
+    """Same as `separable_convolution` with a 1D window along the rows."""
+    nrows, n = x.shape
+    h = len(w) // 2
+    for i in prange(nrows):
+        for j in range(n):
+            s = 0.
+            d = 0.
+            for k in range(max(0, h - j), min(len(w), n + h - j)):
+                if valid[i, j + k - h]:
+                    s += w[k] * x[i, j + k - h]
+                    d += w[k]
+            out[i, j] = s / d if d != 0 else np.nan
+
+
+@njit(parallel=True, cache=True)
+def running_median(x, Lwing, out):
+    """
+    `_running_median` of every row of `x`, with the sorted window kept in
+    a preallocated buffer.  Each update shifts up to `2 * Lwing` values,
+    which beats the bisection of Python lists for any practical window.
+
+    """
+    nrows, N = x.shape
+    for r in prange(nrows):
+        row = x[r]
+        # One more slot than the window, samples enter before others leave.
+        window = np.empty(2 * Lwing + 2, x.dtype)
+        n = 0
+        nans = 0
+        for i in range(-Lwing, N):
+            if i + Lwing < N:  # Sample entering the window.
+                v = row[i + Lwing]
+                if np.isnan(v):
+                    nans += 1
+                else:
+                    pos = np.searchsorted(window[:n], v)
+                    for k in range(n, pos, -1):
+                        window[k] = window[k - 1]
+                    window[pos] = v
+                    n += 1
+            if i > Lwing:  # Sample leaving the window.
+                v = row[i - Lwing - 1]
+                if np.isnan(v):
+                    nans -= 1
+                else:
+                    pos = np.searchsorted(window[:n], v)
+                    for k in range(pos, n - 1):
+                        window[k] = window[k + 1]
+                    n -= 1
+            if i < 0:
+                continue
+            h = n // 2
+            if nans:
+                out[r, i] = np.nan
+            elif n % 2:
+                out[r, i] = window[h]
+            else:  # Even windows at the edges.
+                out[r, i] = 0.5 * (np.float64(window[h - 1]) + window[h])
+
+
+@njit(parallel=True, cache=True)
+def running_median2(A, hei, wid, out):
+    """
+    `medfilt2` of `A` with one sorted window per row, slid along the row.
+    Each column is sorted once, when it enters the window, and each step
+    is a single merge pass that drops the leaving column and inserts the
+    entering one, O(hei * wid) per point instead of sorting every window.
+
+    """
+    imax, jmax = A.shape
+    lh, lw = hei // 2, wid // 2
+    for i in prange(imax):
+        r0, r1 = max(i - lh, 0), min(i + lh + 1, imax)
+        window = np.empty(hei * wid, A.dtype)
+        merged = np.empty(hei * wid, A.dtype)
+        # Sorted valid values of the columns in the window, and one more.
+        cols = np.empty((wid + 1, hei), A.dtype)
+        ncols = np.zeros(wid + 1, np.intp)
+        n = 0
+        for j in range(min(lw, jmax)):
+            ncols[j] = _sorted_column(A, r0, r1, j, cols[j])
+            for k in range(ncols[j]):
+                window[n] = cols[j, k]
+                n += 1
+        window[:n].sort()
+
+        for j in range(jmax):
+            so, si = (j - lw - 1) % (wid + 1), (j + lw) % (wid + 1)
+            mo = ncols[so] if j - lw - 1 >= 0 else 0
+            mi = 0
+            if j + lw < jmax:
+                mi = _sorted_column(A, r0, r1, j + lw, cols[si])
+                ncols[si] = mi
+
+            if mo or mi:
+                a = b = c = m = 0
+                while a < n:
+                    v = window[a]
+                    a += 1
+                    while b < mi and cols[si, b] < v:
+                        merged[m] = cols[si, b]
+                        m += 1
+                        b += 1
+                    if c < mo and v == cols[so, c]:  # Leaving the window.
+                        c += 1
+                    else:
+                        merged[m] = v
+                        m += 1
+                while b < mi:
+                    merged[m] = cols[si, b]
+                    m += 1
+                    b += 1
+                window, merged = merged, window
+                n = m
+
+            h = n // 2
+            if n == 0 or np.isnan(A[i, j]):
+                out[i, j] = np.nan
+            elif n % 2:
+                out[i, j] = window[h]
+            else:
+                out[i, j] = 0.5 * (np.float64(window[h - 1]) + window[h])
+
+
+@njit(cache=True)
+def _sorted_column(A, r0, r1, j, col):
+    """
+    Insertion sorts the valid values of `A[r0:r1, j]` into `col`, faster
+    than `np.sort` for a few values.  Returns their number.
+
+    """
+    m = 0
+    for r in range(r0, r1):
+        v = A[r, j]
+        if np.isnan(v):
+            continue
+        k = m
+        while k > 0 and col[k - 1] > v:
+            col[k] = col[k - 1]
+            k -= 1
+        col[k] = v
+        m += 1
+    return m
+
+
+@njit(parallel=True, cache=True)
+def shifted_sum(x, w, out):
+    """Valid-mode `sum(w[j] * x[:, j:j + n])`, as in `md_trenberth`."""
+    nrows, n = out.shape
+    for i in prange(nrows):
+        for j in range(n):
+            s = 0.
+            for k in range(len(w)):
+                s += w[k] * x[i, j + k]
+            out[i, j] = s
@@ -2,8 +2,196 @@
 
 from __future__ import (absolute_import, division, print_function)
 
+import functools
+import warnings
+from collections import OrderedDict, namedtuple
+
 import numpy as np
 
+# Kernels longer than this are convolved with FFT overlap-add when
+# `method='auto'`.  Run `benchmarks/bench_convolve.py` to find the crossover.
+_DIRECT_MAX_TAPS = 256
+
+# Default engine of `smoo2`, `weim`, `medfilt1` and `md_trenberth`, see
+# `set_engine`.
+_engine = 'numpy'
+
+KernelCacheInfo = namedtuple('KernelCacheInfo',
+                             ['hits', 'misses', 'maxsize', 'currsize'])
+
+
+class _KernelCache(object):
+    """
+    Bounded LRU cache of read-only filter kernels keyed by their design
+    parameters.
+
+    """
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.clear()
+
+    def get(self, key, design, *args):
+        try:
+            kernel = self._kernels.pop(key)
+            self.hits += 1
+        except KeyError:
+            kernel = design(*args)
+            kernel.flags.writeable = False
+            self.misses += 1
+        self._kernels[key] = kernel  # Most recently used go last.
+        while len(self._kernels) > self.maxsize:
+            self._kernels.popitem(last=False)
+        return kernel
+
+    def clear(self):
+        self._kernels = OrderedDict()
+        self.hits = self.misses = 0
+
+    def info(self):
+        return KernelCacheInfo(self.hits, self.misses, self.maxsize,
+                               len(self._kernels))
+
+
+_kernel_cache = _KernelCache()
+
+
+def _cached_kernel(design):
+    """Routes the kernel design function `design` through the cache."""
+    @functools.wraps(design)
+    def cached(*args):
+        return _kernel_cache.get((design.__name__,) + args, design, *args)
+    return cached
+
+
+def kernel_cache_info():
+    """
+    Returns the hits, misses, maximum size and current size of the cache of
+    filter kernels designed by `lanc`, `pl33tn`, `smoo1`, `smoo2` and `weim`.
+
+    Examples
+    --------
+    >>> from oceans.filters import kernel_cache_clear, kernel_cache_info, lanc
+    >>> kernel_cache_clear()
+    >>> wt = lanc(96, 1./40)
+    >>> wt = lanc(96, 1./40)
+    >>> kernel_cache_info()
+    KernelCacheInfo(hits=1, misses=1, maxsize=256, currsize=1)
+
+    """
+    return _kernel_cache.info()
+
+
+def kernel_cache_clear():
+    """Empties the filter kernel cache and resets its statistics."""
+    _kernel_cache.clear()
+
+
+def set_engine(engine):
+    """
+    Sets the default engine of `smoo2`, `weim`, `medfilt1`, `medfilt2` and
+    `md_trenberth`, also selected per call with their `engine` argument.
+
+    'numpy' (default) runs the vectorized NumPy and SciPy code and 'numba'
+    runs JIT-compiled loops in parallel over the rows or series.  Without
+    numba installed, 'numba' falls back to 'numpy' with a warning.  The
+    first call of each function and dtype pays for the compilation.
+
+    Examples
+    --------
+    >>> from oceans.filters import get_engine, set_engine
+    >>> set_engine('numba')
+    >>> get_engine()
+    'numba'
+    >>> set_engine('numpy')
+
+    """
+    global _engine
+    if engine not in ['numpy', 'numba']:
+        raise ValueError('Invalid engine requested: %s' % engine)
+    _engine = engine
+
+
+def get_engine():
+    """Returns the default engine, see `set_engine`."""
+    return _engine
+
+
+def _jit_kernels(engine=None):
+    """
+    The numba kernels module for `engine` (default the `set_engine` one),
+    or None for the NumPy code.
+
+    """
+    if engine is None:
+        engine = _engine
+    if engine not in ['numpy', 'numba']:
+        raise ValueError('Invalid engine requested: %s' % engine)
+    if engine == 'numpy':
+        return None
+    try:
+        from . import _jit
+    except ImportError:
+        warnings.warn('numba is not installed, using the numpy engine',
+                      RuntimeWarning)
+        return None
+    return _jit
+
+
+def _rows(x):
+    """`x` as a C-contiguous 2D array of rows along its last axis."""
+    return np.ascontiguousarray(x.reshape(-1, x.shape[-1]))
+
+
+def _float_dtype(x, dtype=None, out=None):
+    """
+    Working dtype of a filter: `dtype` if given, else that of `out`, else
+    that of `x` when it is a float of single precision or more.  Anything
+    else is computed in float64.
+
+    """
+    if dtype is None and out is not None:
+        dtype = out.dtype
+    if dtype is None:
+        dtype = np.dtype(getattr(x, 'dtype', np.float64))
+        if dtype.kind != 'f' or dtype.itemsize < 4:
+            dtype = np.float64
+    dtype = np.dtype(dtype)
+    if dtype.kind != 'f':
+        raise ValueError('Invalid dtype requested: %s' % dtype)
+    return dtype
+
+
+def _output(out, shape, dtype, axis=-1, x=None):
+    """
+    Buffer for a result of `shape`, with the filtered axis last.  A view of
+    the caller's `out` with `axis` moved last, or a new array of `dtype`
+    when there is no `out` or when `out` overlaps the input `x`.
+
+    """
+    if out is None or (x is not None and np.may_share_memory(out, x)):
+        return np.empty(shape, dtype)
+    shape = tuple(shape)
+    expected = list(shape)
+    expected.insert(axis % len(shape), expected.pop())
+    if out.shape != tuple(expected):
+        raise ValueError('Output shape {} does not match the result shape '
+                         '{}'.format(out.shape, tuple(expected)))
+    return np.moveaxis(out, axis, -1)
+
+
+def _result(y, out, axis=-1):
+    """
+    Returns the result `y` (filtered axis last) with `axis` moved back, or
+    `out` after copying `y` into it unless `y` was computed in place.
+
+    """
+    if out is None:
+        return np.moveaxis(y, -1, axis)
+    buf = _output(out, y.shape, y.dtype, axis)
+    if not np.may_share_memory(buf, y):
+        buf[...] = y
+    return out
+
 
 def lanc(numwt, haf):
     """
@@ -18,16 +206,21 @@ def lanc(numwt, haf):
           frequency (in 'cpi' of -6dB point, 'cpi' is cycles per interval.
           For hourly data cpi is cph,
 
+    Returns
+    -------
+    wt : array
+         Filter weights, a copy of the cached kernel.
+
     Examples
     --------
-    >>> from oceans.filters import lanc
+    >>> from oceans.filters import convolve, lanc
     >>> import matplotlib.pyplot as plt
     >>> t = np.arange(500)  # Time in hours.
     >>> h = 2.5 * np.sin(2 * np.pi * t / 12.42)
     >>> h += 1.5 * np.sin(2 * np.pi * t / 12.0)
     >>> h += 0.3 * np.random.randn(len(t))
     >>> wt = lanc(96+1+96, 1./40)
-    >>> low = np.convolve(wt, h, mode='same')
+    >>> low = convolve(h, wt, mode='same')
     >>> high = h - low
     >>> fig, (ax0, ax1) = plt.subplots(nrows=2)
     >>> _ = ax0.plot(high, label='high')
@@ -36,6 +229,11 @@ def lanc(numwt, haf):
     >>> _ = ax1.legend(numpoints=1)
 
     """
+    return _lanc(numwt, haf).copy()
+
+
+@_cached_kernel
+def _lanc(numwt, haf):
     summ = 0
     numwt += 1
     wt = np.zeros(numwt)
@@ -52,19 +250,37 @@ def lanc(numwt, haf):
     return np.r_[wt[::-1], wt[1:numwt + 1]]
 
 
-def smoo1(datain, window_len=11, window='hanning'):
+def smoo1(datain, window_len=11, window='hanning', maxgap=None, axis=-1,
+          method='auto', dtype=None, out=None):
     """
     Smooth the data using a window with requested size.
 
     Parameters
     ----------
     datain : array_like
-             input series
+             input series, or N-D array of series along `axis`
     window_len : int
                  size of the smoothing window; should be an odd integer
-    window : str
+    window : str or array
              window from 'flat', 'hanning', 'hamming', 'bartlett', 'blackman'.
-             flat window will produce a moving average smoothing.
+             flat window will produce a moving average smoothing.  An array
+             is used as the window itself and sets `window_len`.
+    maxgap : int, optional
+             If given, NaN gaps of at most `maxgap` points are linearly
+             interpolated and every remaining valid segment is smoothed on
+             its own, with its own reflected ends.  Segments shorter than
+             `window_len` are returned as NaN.
+    axis : int
+           axis along which to smooth, e.g. the time axis of a
+           (depth, time) ADCP matrix.  Default is the last axis.
+    method : str
+             convolution method, see `convolve`.  The default switches to
+             FFT convolution for wide windows.
+    dtype : dtype, optional
+            float dtype of the computation and of the output.  Default is
+            the dtype of `out` or of `datain`, float32 inputs stay float32.
+    out : array, optional
+          array of the same shape as `datain` to store the result in.
 
     Returns
     -------
@@ -110,44 +326,295 @@ def smoo1(datain, window_len=11, window='hanning'):
     >>> l.extend(windows)
     >>> leg = ax.legend(l)
     >>> _ = plt.title('Smoothing a noisy signal')
-
-    TODO: window parameter can be the window itself (i.e. an array)
-    instead of a string.
+    >>> adcp = np.random.randn(20, 500)  # (depth, time)
+    >>> smoothed = smoo1(adcp, window=np.kaiser(51, 8), axis=1)
 
     """
 
-    datain = np.asarray(datain)
+    if isinstance(window, str):
+        if window not in ['flat', 'hanning', 'hamming', 'bartlett',
+                          'blackman']:
+            msg = "Window must be is one of 'flat', 'hanning', 'hamming', 'bartlett', 'blackman'"  # noqa
+            raise ValueError(msg)
+    else:
+        window = np.asarray(window, dtype=float)
+        window_len = len(window)
 
-    if datain.ndim != 1:
-        raise ValueError('Smooth only accepts 1 dimension arrays.')
+    datain = np.asarray(datain)
+    dtype = _float_dtype(datain, dtype, out)
+    datain = np.moveaxis(datain.astype(dtype, copy=False), axis, -1)
 
-    if datain.size < window_len:
+    if datain.shape[-1] < window_len:
         raise ValueError('Input vector needs to be bigger than window size.')
 
     if window_len < 3:
-        return datain
+        return _result(datain, out, axis)
 
-    if window not in ['flat', 'hanning', 'hamming', 'bartlett', 'blackman']:
-        msg = "Window must be is one of 'flat', 'hanning', 'hamming', 'bartlett', 'blackman'"  # noqa
-        raise ValueError(msg)
+    if isinstance(window, str):
+        w = _window(window, window_len)
+    else:
+        w = window
+    w = (w / w.sum()).astype(dtype)
 
-    s = np.r_[2 * datain[0] - datain[window_len:1:-1], datain, 2 *
-              datain[-1] - datain[-1:-window_len:-1]]
+    if maxgap is not None:
+        data_out = _output(out, datain.shape, dtype, axis, x=datain)
+        for idx in np.ndindex(*datain.shape[:-1]):
+            data_out[idx] = _smoo1_segments(datain[idx], window_len, w, maxgap)
+        return _result(data_out, out, axis)
+
+    s = _smoo1_pad(datain, window_len)
+
+    data_out = convolve(s, w, mode='same', method=method)
+    return _result(data_out[..., window_len - 1:-window_len + 1], out, axis)
+
+
+def _smoo1_pad(datain, window_len, out=None):
+    """
+    Reflected copies of `datain` at both ends of its last axis, as used by
+    `smoo1`, written with `datain` into `out` (allocated if None), which
+    holds `2 * (window_len - 1)` more points along the last axis.
+
+    """
+    n = window_len - 1
+    if out is None:
+        out = np.empty(datain.shape[:-1] + (datain.shape[-1] + 2 * n,),
+                       datain.dtype)
+    np.subtract(2 * datain[..., :1], datain[..., window_len:1:-1],
+                out=out[..., :n])
+    out[..., n:-n] = datain
+    np.subtract(2 * datain[..., -1:], datain[..., -1:-window_len:-1],
+                out=out[..., -n:])
+    return out
+
+
+def _smoo1_segments(datain, window_len, w, maxgap):
+    """
+    `smoo1` of every valid segment of `datain`, after filling the gaps of
+    at most `maxgap` points.  The padded segments are concatenated and
+    smoothed with a single convolution.  Segments shorter than the window
+    and the gaps are NaN.
+
+    """
+    datain = _fill_gaps(datain, maxgap, datain.dtype)
+    data_out = np.full(datain.shape, np.NaN, datain.dtype)
+
+    segments = [(start, stop) for start, stop in _segments(~np.isnan(datain))
+                if stop - start >= window_len]
+    if not segments:
+        return data_out
+
+    # Each padded segment holds 2 * (window_len - 1) extra points.
+    extra = 2 * (window_len - 1)
+    s = np.empty(sum(stop - start + extra for start, stop in segments),
+                 datain.dtype)
+    offset = 0
+    for start, stop in segments:
+        _smoo1_pad(datain[start:stop], window_len,
+                   out=s[offset:offset + stop - start + extra])
+        offset += stop - start + extra
+    smoothed = convolve(s, w, mode='same')
+
+    offset = window_len - 1
+    for start, stop in segments:
+        data_out[start:stop] = smoothed[offset:offset + stop - start]
+        offset += stop - start + extra
+    return data_out
+
+
+def _segments(valid):
+    """Returns the (start, stop) indices of the runs of True in `valid`."""
+    edges = np.diff(np.r_[0, valid.astype(int), 0])
+    return zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1))
+
+
+def _fill_gaps(x, maxgap, dtype=float):
+    """
+    Linearly interpolates the runs of at most `maxgap` NaNs along the last
+    axis of `x` that have valid data on both sides.  Returns a copy of
+    `dtype`.
+
+    """
+    x = np.array(x, dtype=dtype)
+    fnan = np.isnan(x)
+    if not maxgap or not fnan.any():
+        return x
+
+    # Index of the previous and of the next valid point.
+    n = x.shape[-1]
+    idx = np.arange(n)
+    prev = np.maximum.accumulate(np.where(fnan, -1, idx), axis=-1)
+    nxt = np.minimum.accumulate(np.where(fnan, n, idx)[..., ::-1],
+                                axis=-1)[..., ::-1]
+
+    fill = fnan & (prev >= 0) & (nxt < n) & (nxt - prev - 1 <= maxgap)
+    prev, nxt = np.clip(prev, 0, n - 1), np.clip(nxt, 0, n - 1)
+    xp = np.take_along_axis(x, prev, axis=-1)
+    xn = np.take_along_axis(x, nxt, axis=-1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        interp = xp + (xn - xp) * (idx - prev) / (nxt - prev)
+    x[fill] = interp[fill]
+    return x
+
+
+def gapfilter(x, weights, maxgap=0, axis=-1, method='auto', dtype=None,
+              out=None):
+    """
+    Gap-aware filtering of series with missing data (NaNs).
+
+    Gaps of at most `maxgap` points are linearly interpolated first.  Each
+    remaining contiguous valid segment is then filtered with `weights`, as
+    in `convolve(segment, weights, mode='valid')`, and the results are put
+    back in place.  All the segments are filtered with a single
+    convolution, so one NaN spoils only the outputs whose kernel span
+    covers it instead of the whole series.
+
+    Parameters
+    ----------
+    x : array_like
+        Input data, with NaNs marking the gaps.
+    weights : 1D array
+              Filter weights with an odd length, e.g. from `lanc`.
+    maxgap : integer
+             Longest gap to interpolate.  Default is 0, no interpolation.
+    axis : integer
+           Axis along which to filter.  Default is the last axis.
+    method : str
+             Convolution method, see `convolve`.
+    dtype : dtype, optional
+            Float dtype of the output, see `convolve`.
+    out : array, optional
+          Array of the same shape as `x` to store the result in.
+
+    Returns
+    -------
+    y : array
+        Filtered data, same shape as `x`, with NaNs where the kernel span is
+        not fully inside a valid segment.
+
+    Examples
+    --------
+    >>> from oceans.filters import gapfilter, lanc
+    >>> t = np.arange(500)  # Time in hours.
+    >>> x = np.sin(2 * np.pi * t / 100.)
+    >>> x[[100, 250, 251, 252]] = np.NaN
+    >>> y = gapfilter(x, lanc(12, 1./40), maxgap=1)
+    >>> np.isnan(y[100]), np.isnan(y[251])
+    (False, True)
+
+    """
+    weights = np.asarray(weights)
+    x = np.asanyarray(x)
+    dtype = _float_dtype(x, dtype, out)
+    x = _fill_gaps(np.moveaxis(x, axis, -1), maxgap, dtype)
+
+    n, M = x.shape[-1], len(weights)
+    y = _output(out, x.shape, dtype, axis)
+    y[...] = np.NaN
+    if n >= M:
+        convolve(x, weights, mode='valid', method=method,
+                 out=y[..., M // 2:M // 2 + n - M + 1])
+    return _result(y, out, axis)
+
+
+def _weim_window(kind, N, beta=14):
+    """
+    The `weim` window `kind` of size `N`, after checking them.
+
+    """
+    # Checking window type and dimensions.
+    kinds = ['hann', 'hamming', 'blackman', 'bartlett', 'kaiser']
+    if (kind not in kinds):
+        raise ValueError('Invalid window type requested: %s' % kind)
+
+    if np.mod(N, 2) == 0:
+        raise ValueError('Window size must be odd')
+
+    return _window(kind, N, beta)
+
+
+def _window(kind, N, beta=14):
+    """
+    Returns the cached 1D window `kind` of size `N`.  The `beta` shape
+    parameter is used only by the kaiser window.
+
+    """
+    return _window_design(kind, N, beta if kind == 'kaiser' else None)
 
-    if window == 'flat':  # Moving average.
-        w = np.ones(window_len, 'd')
-    else:
-        w = eval('np.' + window + '(window_len)')
 
-    data_out = np.convolve(w / w.sum(), s, mode='same')
-    return data_out[window_len - 1:-window_len + 1]
+@_cached_kernel
+def _window_design(kind, N, beta):
+    if kind == 'flat':  # Moving average.
+        return np.ones(N, 'd')
+    if kind == 'kaiser':
+        return np.kaiser(N, beta)
+    if kind == 'hann':
+        # Converting the correct window name (Hann) to the numpy function
+        # name (numpy.hanning).
+        kind = 'hanning'
+    return getattr(np, kind)(N)
+
+
+def _normalized_convolution(data, valid, wdw, out=None):
+    """
+    Weighted mean of `data` over the window `wdw` centered at each point,
+    counting only the points flagged in `valid`.  The window is truncated at
+    the edges (no data outside `data` is used) and points with no valid data
+    under the window are returned as NaN.  The result has the dtype of
+    `data` and is stored in `out` if given.
 
+    The convolutions are accumulated in double precision, even for float32
+    data.  Only the result is cast back, so the points seeing just the tails
+    of the window are not lost in the single precision FFT round-off.
 
-def smoo2(A, hei, wid, kind='hann', badflag=-9999, beta=14):
+    """
+    from scipy.signal import fftconvolve
+
+    dtype = data.dtype
+    wdw = wdw.astype(np.float64)
+    num = fftconvolve(np.where(valid, data, 0).astype(np.float64), wdw,
+                      mode='same')
+    den = fftconvolve(valid.astype(np.float64), wdw, mode='same')
+
+    # The FFT round-off leaves tiny weights where the window holds no data,
+    # about 1e-12 of the total weight.
+    den[den <= 4096 * np.finfo(den.dtype).eps * wdw.sum()] = np.NaN
+    if out is None:
+        return np.divide(num, den).astype(dtype, copy=False)
+    return np.divide(num, den, out=out)
+
+
+def _separable_convolution(data, valid, wdws, axes=None, out=None):
+    """
+    Same as `_normalized_convolution` for the separable window
+    `np.outer(*wdws)`, applied as one 1D pass along each of `axes` (default
+    the first `len(wdws)` axes).
+
+    """
+    from scipy.ndimage import correlate1d
+
+    if axes is None:
+        axes = range(len(wdws))
+
+    def smooth(arr):
+        for axis, w in zip(axes, wdws):
+            arr = correlate1d(arr, w, axis=axis, mode='constant', cval=0)
+        return arr
+
+    data = np.where(valid, data, 0)
+    num = smooth(data)
+    den = smooth(valid.astype(data.dtype))
+
+    den[den == 0] = np.NaN
+    return np.divide(num, den, out=out)
+
+
+def smoo2(A, hei, wid, kind='hann', badflag=-9999, beta=14,
+          method='separable', dtype=None, out=None, engine=None):
     """
     Usage
     -----
-    As = smoo2(A, hei, wid, kind='hann', badflag=-9999, beta=14)
+    As = smoo2(A, hei, wid, kind='hann', badflag=-9999, beta=14,
+               method='separable', dtype=None, out=None, engine=None)
 
     Description
     -----------
@@ -191,6 +658,24 @@ def smoo2(A, hei, wid, kind='hann', badflag=-9999, beta=14):
               Shape parameter for the kaiser window. For windows other than
               the kaiser window, this parameter does nothing.
 
+    method  : string, optional
+              separable (default) : Applies the 1D 'hei' window along the
+                                    rows and then the 1D 'wid' window along
+                                    the columns, O(hei + wid) per point.
+              fft                 : FFT convolution with the 2D window.
+
+    dtype   : dtype, optional
+              Float dtype of the computation and of the output.  Default is
+              the dtype of 'out' or of 'A', float32 arrays stay float32.
+
+    out     : 2D array, optional
+              Array of the same shape as 'A' to store the result in.  It may
+              be 'A' itself.
+
+    engine  : string, optional
+              'numpy' or 'numba' for the separable method, default from
+              `set_engine`.
+
     Returns
     -------
     As      : 2D array
@@ -211,87 +696,160 @@ def smoo2(A, hei, wid, kind='hann', badflag=-9999, beta=14):
     if (hei <= 1) or (wid <= 1):
         raise ValueError('Window shape must be (3,3) or greater')
 
-    # Creating the 2D window.
-    if (kind == 'kaiser'):  # If the window kind is kaiser (beta is required).
-        wstr = 'np.outer(np.kaiser(hei, beta), np.kaiser(wid, beta))'
-    # If the window kind is hann, hamming, blackman or bartlett
-    # (beta is not required).
-    else:
-        if kind == 'hann':
-            # Converting the correct window name (Hann) to the numpy function
-            # name (numpy.hanning).
-            kind = 'hanning'
-        # Computing outer product to make a 2D window out of the original 1d
-        # windows.
-        # TODO: Get rid of this evil eval.
-        wstr = 'np.outer(np.' + kind + '(hei), np.' + kind + '(wid))'
-    wdw = eval(wstr)
-
-    A = np.asanyarray(A)
+    if method not in ['separable', 'fft']:
+        raise ValueError('Invalid method requested: %s' % method)
+
+    # Creating the 1D windows.  The 2D window is their outer product.
+    wdw = (_window(kind, hei, beta), _window(kind, wid, beta))
+    if method == 'fft':
+        wdw = np.outer(*wdw)
+
+    A = np.asarray(A)
+    dtype = _float_dtype(A, dtype, out)
+    A = A.astype(dtype, copy=False)
+    As = _output(out, A.shape, dtype, x=A)
     Fnan = np.isnan(A)
-    imax, jmax = A.shape
-    As = np.NaN * np.ones((imax, jmax))
-
-    for i in range(imax):
-        for j in range(jmax):
-            # Default window parameters.
-            wupp = 0
-            wlow = hei
-            wlef = 0
-            wrig = wid
-            lh = np.floor(hei / 2)
-            lw = np.floor(wid / 2)
-
-            # Default array ranges (functions of the i, j indices).
-            upp = i - lh
-            low = i + lh + 1
-            lef = j - lw
-            rig = j + lw + 1
-
-            # Tiling window and input array at the edges.
-            # Upper edge.
-            if upp < 0:
-                wupp = wupp - upp
-                upp = 0
-
-            # Left edge.
-            if lef < 0:
-                wlef = wlef - lef
-                lef = 0
-
-            # Bottom edge.
-            if low > imax:
-                ex = low - imax
-                wlow = wlow - ex
-                low = imax
-
-            # Right edge.
-            if rig > jmax:
-                ex = rig - jmax
-                wrig = wrig - ex
-                rig = jmax
-
-            # Computing smoothed value at point (i, j).
-            Ac = A[upp:low, lef:rig]
-            wdwc = wdw[wupp:wlow, wlef:wrig]
-            fnan = np.isnan(Ac)
-            Ac[fnan] = 0
-            wdwc[fnan] = 0  # Eliminating NaNs from mean computation.
-            fbad = Ac == badflag
-            wdwc[fbad] = 0  # Eliminating bad data from mean computation.
-            a = Ac * wdwc
-            As[i, j] = a.sum() / wdwc.sum()
+    # Eliminating NaNs and bad data from the mean computation.
+    valid = ~(Fnan | (A == badflag))
+    jit = _jit_kernels(engine)
+    if method == 'separable' and jit is not None:
+        # The kernel writes into a C-contiguous buffer.
+        res = As if As.flags.c_contiguous else np.empty(A.shape, dtype)
+        jit.separable_convolution(np.ascontiguousarray(A),
+                                  np.ascontiguousarray(valid),
+                                  wdw[0].astype(dtype), wdw[1].astype(dtype),
+                                  res)
+        if res is not As:
+            As[...] = res
+    elif method == 'separable':
+        _separable_convolution(A, valid, wdw, out=As)
+    else:
+        _normalized_convolution(A, valid, wdw, out=As)
     # Assigning NaN to the positions holding NaNs in the original array.
     As[Fnan] = np.NaN
 
-    return As
+    return _result(As, out)
+
+
+def _smoo2_tile(args):
+    """Smooths one haloed tile and crops the halo (pool worker)."""
+    block, crop, hei, wid, kw = args
+    return smoo2(block, hei, wid, **kw)[crop]
+
 
+def smoo2_tiled(A, hei, wid, out=None, tile=(1024, 1024), processes=None,
+                dtype=None, **kw):
+    """
+    Tiled, out-of-core version of `smoo2` for arrays larger than memory.
+
+    The input is read one tile at a time, with halos of `hei // 2` rows and
+    `wid // 2` columns, and the tiles are smoothed in a process pool.  Only a
+    few tiles per process are kept in memory at any time and the result is
+    the same as a single in-memory `smoo2` call.
+
+    Parameters
+    ----------
+    A : 2D array_like
+        Any array supporting `shape` and 2D slicing, e.g. a `numpy.memmap`
+        or a `netCDF4.Variable`.  Masked values are treated as NaNs.
+    hei, wid : integer
+               Window shape, see `smoo2`.
+    out : 2D array or str, optional
+          Writable output array (e.g. a `numpy.memmap`) or the path of a
+          memory-mapped file to create.  Default is an in-memory array.
+    tile : tuple of integers
+           Tile shape (rows, columns), without the halos.
+    processes : integer, optional
+                Size of the process pool.  Default is the number of CPUs,
+                and 1 smooths the tiles in the current process.  Once a
+                numba parallel engine has run, the pool is spawned instead
+                of forked and scripts need an `if __name__ == '__main__':`
+                guard.
+    dtype : dtype, optional
+            Float dtype of the tiles and of a new output.  Default is the
+            dtype of an `out` array or of `A`, float32 data stays float32.
+    kw : Extra keyword arguments for `smoo2`.
+
+    Returns
+    -------
+    out : 2D array
+          The smoothed array.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from oceans.filters import smoo2, smoo2_tiled
+    >>> A = np.random.randn(300, 200)
+    >>> As = smoo2_tiled(A, 11, 11, tile=(128, 128), processes=1)
+    >>> np.allclose(As, smoo2(A, 11, 11))
+    True
 
-def weim(x, N, kind='hann', badflag=-9999, beta=14):
+    """
+    from collections import deque
+    from multiprocessing import cpu_count
+
+    from ..utilities import _pool_context
+
+    imax, jmax = A.shape
+    dtype = _float_dtype(A, dtype, None if isinstance(out, str) else out)
+    if out is None:
+        out = np.empty((imax, jmax), dtype)
+    elif isinstance(out, str):
+        out = np.memmap(out, dtype=dtype, mode='w+', shape=(imax, jmax))
+    if out.shape != (imax, jmax):
+        raise ValueError('Output shape {} does not match the input shape '
+                         '{}'.format(out.shape, (imax, jmax)))
+
+    lh, lw = hei // 2, wid // 2
+    ti, tj = tile
+
+    def tasks():
+        for i0 in range(0, imax, ti):
+            for j0 in range(0, jmax, tj):
+                i1, j1 = min(i0 + ti, imax), min(j0 + tj, jmax)
+                upp, low = max(i0 - lh, 0), min(i1 + lh, imax)
+                lef, rig = max(j0 - lw, 0), min(j1 + lw, jmax)
+                block = np.ma.filled(
+                    np.ma.asarray(A[upp:low, lef:rig], dtype=dtype), np.NaN)
+                crop = (slice(i0 - upp, i1 - upp), slice(j0 - lef, j1 - lef))
+                yield ((slice(i0, i1), slice(j0, j1)),
+                       (block, crop, hei, wid, kw))
+
+    if processes is None:
+        processes = cpu_count()
+
+    if processes == 1:
+        for where, args in tasks():
+            out[where] = _smoo2_tile(args)
+    else:
+        # Submitting tiles only as results come back bounds the memory use.
+        pool = _pool_context().Pool(processes)
+        try:
+            pending = deque()
+            for where, args in tasks():
+                pending.append((where, pool.apply_async(_smoo2_tile,
+                                                        (args,))))
+                if len(pending) >= 2 * processes:
+                    where, res = pending.popleft()
+                    out[where] = res.get()
+            while pending:
+                where, res = pending.popleft()
+                out[where] = res.get()
+        finally:
+            pool.terminate()
+
+    if isinstance(out, np.memmap):
+        out.flush()
+    return out
+
+
+def weim(x, N, kind='hann', badflag=-9999, beta=14, axis=None, dtype=None,
+         out=None, engine=None):
     """
     Usage
     -----
-    xs = weim(x, N, kind='hann', badflag=-9999, beta=14)
+    xs = weim(x, N, kind='hann', badflag=-9999, beta=14, axis=None,
+              dtype=None, out=None, engine=None)
 
     Description
     -----------
@@ -300,7 +858,7 @@ def weim(x, N, kind='hann', badflag=-9999, beta=14):
 
     Parameters
     ----------
-    x       : 1D array
+    x       : array
               Array to be smoothed.
 
     N       : integer
@@ -332,100 +890,91 @@ def weim(x, N, kind='hann', badflag=-9999, beta=14):
               Shape parameter for the kaiser window. For windows other than the
               kaiser window, this parameter does nothing.
 
+    axis    : integer, optional
+              Axis along which to smooth, e.g. the time axis of an
+              (nseries, ntime) array.  The default, None, smooths the
+              flattened array.
+
+    dtype   : dtype, optional
+              Float dtype of the computation and of the output.  Default is
+              the dtype of 'out' or of 'x', float32 arrays stay float32.
+
+    out     : array, optional
+              Array of the output shape to store the result in.
+
+    engine  : string, optional
+              'numpy' or 'numba', default from `set_engine`.
+
     Returns
     -------
-    xs      : 1D array
-              The smoothed array.
+    xs      : array
+              The smoothed array.  1D if `axis` is None, otherwise the same
+              shape as `x`.
 
     ---------------------------------------
     André Palóczy Filho (paloczy@gmail.com) June 2012
 
     """
-    # Checking window type and dimensions.
-    kinds = ['hann', 'hamming', 'blackman', 'bartlett', 'kaiser']
-    if (kind not in kinds):
-        raise ValueError('Invalid window type requested: %s' % kind)
-
-    if np.mod(N, 2) == 0:
-        raise ValueError('Window size must be odd')
-
-    # Creating the window.
-    if (kind == 'kaiser'):  # If the window kind is kaiser (beta is required).
-        wstr = 'np.kaiser(N, beta)'
-    # If the window kind is hann, hamming, blackman or bartlett (beta is not
-    # required).
+    w = _weim_window(kind, N, beta)
+
+    x = np.asarray(x)
+    dtype = _float_dtype(x, dtype, out)
+    x = x.astype(dtype, copy=False)
+    if axis is None:
+        x, axis = x.ravel(), -1
+    xs = _output(out, x.shape, dtype, x=x)
+    Fnan = np.isnan(x)
+
+    # Counting only NON-NaNs and NON-bad data.  Points with no valid data
+    # under the window are NaN.
+    valid = ~(Fnan | (x == badflag))
+    jit = _jit_kernels(engine)
+    if jit is not None:
+        rows = np.moveaxis(x, axis, -1)
+        res = np.empty((rows.size // rows.shape[-1], rows.shape[-1]), dtype)
+        jit.normalized_rows(_rows(rows), _rows(np.moveaxis(valid, axis, -1)),
+                            w.astype(dtype), res)
+        np.moveaxis(xs, axis, -1)[...] = res.reshape(rows.shape)
     else:
-        if kind == 'hann':
-            # Converting the correct window name (Hann) to the numpy function
-            # name (numpy.hanning).
-            kind = 'hanning'
-            # Computing outer product to make a 2D window out of the original
-            # 1D windows.
-        wstr = 'np.' + kind + '(N)'
-
-    # FIXME: Do not use `eval`.
-    w = eval(wstr)
-    x = np.asarray(x).flatten()
-    Fnan = np.isnan(x).flatten()
-
-    ln = (N - 1) / 2
-    lx = x.size
-    lf = lx - ln
-    xs = np.NaN * np.ones(lx)
-
-    # Eliminating bad data from mean computation.
-    fbad = x == badflag
-    x[fbad] = np.nan
-
-    for i in range(lx):
-        if i <= ln:
-            xx = x[:ln + i + 1]
-            ww = w[ln - i:]
-        elif i >= lf:
-            xx = x[i - ln:]
-            ww = w[:lf - i - 1]
-        else:
-            xx = x[i - ln:i + ln + 1]
-            ww = w.copy()
-
-        # Counting only NON-NaNs, both in the input array and in the window
-        # points.
-        f = ~np.isnan(xx)
-        xx = xx[f]
-        ww = ww[f]
-
-        # Thou shalt not divide by zero.
-        if f.sum() == 0:
-            xs[i] = x[i]
-        else:
-            xs[i] = np.sum(xx * ww) / np.sum(ww)
+        _separable_convolution(x, valid, [w], axes=[axis], out=xs)
 
     # Assigning NaN to the positions holding NaNs in the input array.
-    xs[Fnan] = np.nan
+    xs[Fnan] = np.NaN
 
-    return xs
+    return _result(xs, out)
 
 
-def medfilt1(x, L=3):
+def medfilt1(x, L=3, axis=-1, dtype=None, out=None, engine=None):
     """
     Median filter for 1d arrays.
 
     Performs a discrete one-dimensional median filter with window length `L` to
     input vector `x`.  Produces a vector the same size as `x`.  Boundaries are
     handled by shrinking `L` at edges; no data outside of `x` is used in
-    producing the median filtered output.
+    producing the median filtered output.  N-D arrays are filtered along
+    `axis`.  The window is updated incrementally, so the cost is
+    O(N log L) per series.
 
     Parameters
     ----------
     x : array_like
-        Input 1D data
+        Input data
     L : integer
         Window length
+    axis : integer
+           Axis along which to filter.  Default is the last axis.
+    dtype : dtype, optional
+            Float dtype of the output.  Default is the dtype of `out` or of
+            `x`, float32 inputs stay float32.
+    out : array, optional
+          Array of the same shape as `x` to store the result in.
+    engine : str, optional
+             'numpy' or 'numba', default from `set_engine`.
 
     Returns
     -------
     xout : array_like
-           Numpy 1d array of median filtered result; same size as x
+           Numpy array of median filtered result; same shape as x
 
     Examples
     --------
@@ -467,7 +1016,7 @@ def medfilt1(x, L=3):
     """
 
     xin = np.atleast_1d(np.asanyarray(x))
-    N = len(x)
+    N = xin.shape[axis]
     L = int(L)  # Ensure L is odd integer so median requires no interpolation.
     if L % 2 == 0:
         L += 1
@@ -485,30 +1034,192 @@ def medfilt1(x, L=3):
         raise ValueError(msg(L, N))
         return None
 
-    if xin.ndim > 1:
-        msg = 'Input sequence has to be 1d: ndim = {}'.format
-        raise ValueError(msg(xin.ndim))
+    Lwing = (L - 1) // 2
 
-    xout = np.zeros_like(xin) + np.NaN
+    xin = np.moveaxis(xin, axis, -1)
+    dtype = _float_dtype(xin, dtype, out)
+    xout = _output(out, xin.shape, dtype, axis, x=xin)
+    jit = _jit_kernels(engine)
+    if jit is not None:
+        res = np.empty((xin.size // N, N), dtype)
+        jit.running_median(_rows(xin.astype(dtype, copy=False)), Lwing, res)
+        xout[...] = res.reshape(xin.shape)
+    else:
+        for idx in np.ndindex(*xin.shape[:-1]):
+            xout[idx] = _running_median(xin[idx], Lwing)
+    return _result(xout, out, axis)
 
-    Lwing = (L - 1) // 2
 
-    # NOTE: Use np.ndenumerate in case I expand to +1D case
-    for i, xi in enumerate(xin):
-        if i < Lwing:  # Left boundary.
-            xout[i] = np.median(xin[0:i + Lwing + 1])   # (0 to i + Lwing)
-        elif i >= N - Lwing:  # Right boundary.
-            xout[i] = np.median(xin[i - Lwing:N])  # (i-Lwing to N-1)
-        else:  # Middle (N-2*Lwing input vector and filter window overlap).
-            xout[i] = np.median(xin[i - Lwing:i + Lwing + 1])
-            # (i-Lwing to i+Lwing)
+def _running_median(x, Lwing):
+    """
+    Running median of the 1D series `x` over the windows
+    `x[i - Lwing:i + Lwing + 1]`, shrunk at the edges.
+
+    The window is kept as a sorted list that is updated with one bisection
+    insert and one bisection delete per sample, O(N log L) comparisons
+    instead of sorting every window.  NaNs are counted instead of sorted and
+    any window holding a NaN returns NaN, like `np.median`.
+
+    """
+    from bisect import bisect_left, insort
+
+    x = x.tolist()
+    N = len(x)
+    xout = [np.NaN] * N
+    window = []
+    nans = 0
+
+    for v in x[:Lwing]:
+        if v != v:
+            nans += 1
+        else:
+            insort(window, v)
+
+    for i in range(N):
+        if i + Lwing < N:  # Sample entering the window.
+            v = x[i + Lwing]
+            if v != v:
+                nans += 1
+            else:
+                insort(window, v)
+        if i > Lwing:  # Sample leaving the window.
+            v = x[i - Lwing - 1]
+            if v != v:
+                nans -= 1
+            else:
+                del window[bisect_left(window, v)]
+        if not nans:
+            n = len(window)
+            h = n // 2
+            if n % 2:
+                xout[i] = window[h]
+            else:  # Even windows at the edges.
+                xout[i] = 0.5 * (window[h - 1] + window[h])
     return xout
 
 
-def fft_lowpass(signal, low, high):
+def medfilt2(A, L=3, dtype=None, out=None, engine=None):
+    """
+    NaN-aware median filter for 2D arrays.
+
+    Performs a discrete two-dimensional median filter with window shape `L`
+    (an integer or a (height, width) pair, made odd like in `medfilt1`) to
+    the array `A`, e.g. to despeckle satellite swaths.  As in `medfilt1`,
+    the window shrinks at the boundaries and no data outside of `A` is
+    used.  NaNs are ignored inside the windows and kept in the output.
+
+    Parameters
+    ----------
+    A : array_like
+        Input 2D data
+    L : integer or tuple of integers
+        Window shape
+    dtype : dtype, optional
+            Float dtype of the computation and of the output.  Default is
+            the dtype of `out` or of `A`, float32 arrays stay float32.
+    out : array, optional
+          Array of the same shape as `A` to store the result in.
+    engine : str, optional
+             'numpy' or 'numba', default from `set_engine`.
+
+    Returns
+    -------
+    Aout : array_like
+           Median filtered array; same shape as A
+
+    Examples
+    --------
+    >>> from oceans.filters import medfilt2
+    >>> A = np.arange(25.).reshape(5, 5)
+    >>> A[2, 2], A[0, 4] = 1000., np.NaN
+    >>> Aout = medfilt2(A, 3)
+    >>> float(Aout[2, 2]), float(Aout[0, 0]), float(Aout[0, 3])
+    (13.0, 3.0, 7.0)
+
+    Notes
+    -----
+    The 'numpy' engine sorts the windows of a block of rows at once, NaNs
+    last, and reads the median at the positions given by the number of
+    valid points in each window.  There is no Python loop over the points,
+    but every window is sorted, O(hw log(hw)) per point for a (h, w)
+    window: use it for despeckling windows up to about 7x7.  The 'numba'
+    engine slides one sorted window along each row, merging in the entering
+    column and dropping the leaving one, O(hw) per point, for larger
+    windows and swaths.
+
+    """
+    from numpy.lib.stride_tricks import as_strided
+
+    A = np.asarray(A)
+    dtype = _float_dtype(A, dtype, out)
+    A = A.astype(dtype, copy=False)
+    if A.ndim != 2:
+        msg = 'Input array has to be 2d: ndim = {}'.format
+        raise ValueError(msg(A.ndim))
+
+    hei, wid = (L, L) if np.ndim(L) == 0 else L
+    hei, wid = int(hei) | 1, int(wid) | 1
+    lh, lw = hei // 2, wid // 2
+
+    jit = _jit_kernels(engine)
+    if jit is not None:
+        Aout = np.empty(A.shape, dtype)
+        jit.running_median2(np.ascontiguousarray(A), hei, wid, Aout)
+        return _result(Aout, out)
+
+    Fnan = np.isnan(A)
+    imax, jmax = A.shape
+
+    # Windows spilling out of the array hold NaNs, which are ignored.
+    P = np.full((imax + 2 * lh, jmax + 2 * lw), np.NaN, dtype)
+    P[lh:lh + imax, lw:lw + jmax] = A
+
+    # Number of valid points in each window.
+    count = _box_count(~Fnan, hei, wid)
+
+    Aout = _output(out, A.shape, dtype, x=A)
+    rows = max(1, 2 ** 22 // (jmax * hei * wid))
+    for i0 in range(0, imax, rows):
+        i1 = min(i0 + rows, imax)
+        block = P[i0:i1 + 2 * lh]
+        windows = as_strided(block, shape=(i1 - i0, jmax, hei, wid),
+                             strides=2 * block.strides, writeable=False)
+        windows = np.sort(windows.reshape(i1 - i0, jmax, hei * wid), axis=-1)
+
+        n = count[i0:i1, :, None]
+        lo = np.take_along_axis(windows, np.maximum(n - 1, 0) // 2, axis=-1)
+        hi = np.take_along_axis(windows, n // 2, axis=-1)
+        Aout[i0:i1] = np.where(n > 0, 0.5 * (lo + hi), np.NaN)[..., 0]
+
+    Aout[Fnan] = np.NaN
+    return _result(Aout, out)
+
+
+def _box_count(valid, hei, wid):
+    """
+    Number of True points of `valid` in the (`hei`, `wid`) window centered
+    at each point, truncated at the edges, from a summed-area table.
+
+    """
+    imax, jmax = valid.shape
+    lh, lw = hei // 2, wid // 2
+    table = np.zeros((imax + 1, jmax + 1), dtype=int)
+    table[1:, 1:] = valid.cumsum(axis=0).cumsum(axis=1)
+
+    upp = np.clip(np.arange(imax) - lh, 0, imax)[:, None]
+    low = np.clip(np.arange(imax) + lh + 1, 0, imax)[:, None]
+    lef = np.clip(np.arange(jmax) - lw, 0, jmax)
+    rig = np.clip(np.arange(jmax) + lw + 1, 0, jmax)
+    return (table[low, rig] - table[upp, rig] -
+            table[low, lef] + table[upp, lef])
+
+
+def fft_lowpass(signal, low, high, dtype=None, out=None):
     """
     Performs a low pass filer on the series.
     low and high specifies the boundary of the filter.
+    The result has the float dtype `dtype` (default that of `out` or of
+    `signal`) and is stored in `out` if given.
 
     >>> from oceans.filters import fft_lowpass
     >>> import matplotlib.pyplot as plt
@@ -530,6 +1241,21 @@ def fft_lowpass(signal, low, high):
         result = np.fft.rfft(signal)
 
     freq = np.fft.fftfreq(len(signal))[:len(signal) // 2 + 1]
+    factor = _lowpass_factor(freq, low, high)
+
+    result = result * factor
+
+    dtype = _float_dtype(signal, dtype, out)
+    y = np.fft.irfft(result, len(signal)).astype(dtype, copy=False)
+    return _result(y, out)
+
+
+def _lowpass_factor(freq, low, high):
+    """
+    The `fft_lowpass` transfer function at `freq`: 1 up to `high`, 0 above
+    `low` and a linear ramp in between.
+
+    """
     factor = np.ones_like(freq)
     factor[freq > low] = 0.0
     sl = np.logical_and(high < freq, freq < low)
@@ -543,13 +1269,96 @@ def fft_lowpass(signal, low, high):
 
     # Insert ramp into factor.
     factor[sl] = a
+    return factor
 
-    result = result * factor
 
-    return np.fft.irfft(result, len(signal))
+def fft_filterbank(signal, cutoffs, axis=-1, pad=True, dtype=None,
+                   out=None):
+    """
+    Splits `signal` into complementary frequency bands with a single FFT.
+
+    Each `(low, high)` pair in `cutoffs` is a low-pass ramp like the one in
+    `fft_lowpass`, and the bands are the differences between consecutive
+    low-pass transfer functions: the first band is everything below the
+    first ramp and the last band is everything above the last one.  The
+    bands add up to `signal`.
 
+    Parameters
+    ----------
+    signal : array_like
+             Input data.
+    cutoffs : sequence of (low, high) pairs
+              Ramp boundaries in cycles per sample, sorted by frequency.
+    axis : integer
+           Axis along which to filter.  Default is the last axis.
+    pad : bool
+          Zero-pad the series to a fast FFT length (default).  Use False to
+          get the same bands as repeated `fft_lowpass` calls.
+    dtype : dtype, optional
+            Float dtype of the bands.  Default is the dtype of `signal`,
+            float32 inputs stay float32.
+    out : sequence of arrays, optional
+          One array per band, e.g. an array of shape
+          `(len(cutoffs) + 1,) + signal.shape`, to store the bands in.
 
-def md_trenberth(x):
+    Returns
+    -------
+    bands : list of arrays
+            `len(cutoffs) + 1` band-limited series, from low to high
+            frequencies, with the same shape as `signal`.
+
+    Examples
+    --------
+    >>> from oceans.filters import fft_filterbank
+    >>> t = np.arange(24 * 60)  # Time in hours.
+    >>> x = 2.5 * np.sin(2 * np.pi * t / 12.42)  # Semi-diurnal tide.
+    >>> x += 1.0 * np.sin(2 * np.pi * t / 19.0)  # Inertial (~39S).
+    >>> x += 0.5 * np.sin(2 * np.pi * t / 240.0)  # Subinertial.
+    >>> sub, inertial, tidal = fft_filterbank(x, [(1/40, 1/60),
+    ...                                           (1/16, 1/17)])
+    >>> np.allclose(sub + inertial + tidal, x)
+    True
+
+    """
+    from scipy.fftpack import next_fast_len
+
+    signal = np.asanyarray(signal)
+    dtype = _float_dtype(signal, dtype)
+    signal = np.moveaxis(signal, axis, -1)
+    n = signal.shape[-1]
+    nfft = next_fast_len(n) if pad else n
+
+    result = np.fft.rfft(signal, nfft)
+    if pad:
+        freq = np.fft.rfftfreq(nfft)
+    else:
+        # The `fft_lowpass` grid, where an even length Nyquist bin is -0.5.
+        freq = np.fft.fftfreq(nfft)[:nfft // 2 + 1]
+
+    lowpass = [_lowpass_factor(freq, low, high) for low, high in cutoffs]
+    factors = np.diff([np.zeros_like(freq)] + lowpass + [np.ones_like(freq)],
+                      axis=0)
+
+    if out is None:
+        out = [None] * len(factors)
+    elif len(out) != len(factors):
+        raise ValueError('Expected {} output arrays, got {}'.format(
+            len(factors), len(out)))
+
+    return [_result(np.fft.irfft(result * factor,
+                                 nfft)[..., :n].astype(dtype, copy=False),
+                    band, axis)
+            for factor, band in zip(factors, out)]
+
+
+# Trenberth (1984) 11-point low-pass weights.
+_trenberth = np.array([0.02700, 0.05856, 0.09030, 0.11742, 0.13567, 0.14210,
+                       0.13567, 0.11742, 0.09030, 0.05856, 0.02700])
+_trenberth.flags.writeable = False
+
+
+def md_trenberth(x, axis=-1, mode='valid', dtype=None, out=None,
+                 engine=None):
     """
     Returns the filtered series using the Trenberth filter as described
     on Monthly Weather Review, vol. 112, No. 2, Feb 1984.
@@ -557,6 +1366,12 @@ def md_trenberth(x):
     Input data: series x of dimension 1Xn (must be at least dimension 11)
     Output data: y = md_trenberth(x) where y has dimension 1X(n-10)
 
+    N-D arrays are filtered along `axis`.  With `mode='same'` the output has
+    the same shape as `x` with the 5 undetermined points at each end set to
+    NaN.  The output has the float dtype `dtype`, by default that of `out`
+    or of `x` (float32 stays float32), and is stored in `out` if given.
+    `engine` is 'numpy' or 'numba', default from `set_engine`.
+
     Examples
     --------
     >>> from oceans.filters import md_trenberth
@@ -571,23 +1386,389 @@ def md_trenberth(x):
     >>> pad = [np.NaN]*5
     >>> l2, = ax.plot(t, np.r_[pad, filtered, pad], label='filtered')
     >>> legend = ax.legend()
+    >>> np.allclose(md_trenberth(x, mode='same')[5:-5], filtered)
+    True
 
     """
+    if mode not in ['valid', 'same']:
+        raise ValueError('Invalid mode requested: %s' % mode)
+
     x = np.asanyarray(x)
-    weight = np.array([0.02700, 0.05856, 0.09030, 0.11742, 0.13567, 0.14210,
-                       0.13567, 0.11742, 0.09030, 0.05856, 0.02700])
+    dtype = _float_dtype(x, dtype, out)
+    x = np.moveaxis(x.astype(dtype, copy=False), axis, -1)
+    weight = _trenberth.astype(dtype)
+
+    sz = x.shape[-1]
+    if sz < len(weight):
+        raise ValueError('Input series must have at least 11 points.')
+
+    shape = x.shape[:-1] + (sz if mode == 'same' else sz - 10,)
+    y = _output(out, shape, dtype, axis, x=x)
+    if mode == 'same':
+        y[..., :5] = y[..., -5:] = np.NaN
+        valid = y[..., 5:-5]
+    else:
+        valid = y
+
+    # Sum of the 11 shifted copies of the series times their weights.
+    jit = _jit_kernels(engine)
+    if jit is not None:
+        res = np.empty((x.size // sz, sz - 10), dtype)
+        jit.shifted_sum(_rows(x), weight, res)
+        valid[...] = res.reshape(valid.shape)
+    else:
+        valid[...] = 0
+        for j, w in enumerate(weight):
+            valid += w * x[..., j:sz - 10 + j]
 
-    sz = len(x)
-    y = np.zeros(sz - 10)
-    for i in range(5, sz - 5):
-        y[i - 5] = 0
-        for j in range(11):
-            y[i - 5] = y[i - 5] + x[i - 6 + j + 1] * weight[j]
+    return _result(y, out, axis)
+
+
+def convolve(x, weights, axis=-1, mode='valid', method='auto', dtype=None,
+             out=None):
+    """
+    Convolves every series in `x` along `axis` with the filter `weights`,
+    e.g. the `lanc` weights.  Same as `np.convolve(x, weights, mode)` for
+    each series.
 
+    Parameters
+    ----------
+    x : array_like
+        Input data.
+    weights : 1D array
+              Filter weights.
+    axis : integer
+           Axis along which to filter.  Default is the last axis.
+    mode : str
+           'valid' (default), 'same' or 'full', see `np.convolve`.
+    method : str
+             'direct' convolution, 'fft' overlap-add convolution or 'auto'
+             (default), which picks 'direct' for short kernels and 'fft' for
+             long ones.
+    dtype : dtype, optional
+            Float dtype of the computation and of the output.  Default is
+            the dtype of `out` or of `x`: float32 data stays float32 and
+            the weights are cast to it.
+    out : array, optional
+          Array of the output shape to store the result in.
+
+    Returns
+    -------
+    y : array
+        Filtered data.  NaNs spoil only the outputs whose kernel span
+        covers them, with either method.
+
+    Examples
+    --------
+    >>> from oceans.filters import convolve, lanc
+    >>> x = np.random.randn(3, 1000)
+    >>> wt = lanc(96+1+96, 1./40)
+    >>> y = convolve(x, wt, axis=1, mode='same')
+    >>> np.allclose(y[0], np.convolve(x[0], wt, mode='same'))
+    True
+
+    """
+    weights = np.asarray(weights)
+    if method == 'auto':
+        method = 'direct' if len(weights) <= _DIRECT_MAX_TAPS else 'fft'
+    if method not in ['direct', 'fft']:
+        raise ValueError('Invalid method requested: %s' % method)
+
+    x = np.asanyarray(x)
+    dtype = _float_dtype(x, dtype, out)
+    x = np.moveaxis(x.astype(dtype, copy=False), axis, -1)
+    weights = weights.astype(dtype, copy=False)
+    if method == 'direct':
+        N, M = x.shape[-1], len(weights)
+        n = {'full': N + M - 1, 'same': max(N, M),
+             'valid': max(N, M) - min(N, M) + 1}.get(mode)
+        if n is None:
+            raise ValueError('Invalid mode requested: %s' % mode)
+        y = _output(out, x.shape[:-1] + (n,), dtype, axis, x=x)
+        for idx in np.ndindex(*x.shape[:-1]):
+            y[idx] = np.convolve(x[idx], weights, mode=mode)
+    else:
+        from scipy.signal import oaconvolve
+
+        N, M = x.shape[-1], len(weights)
+
+        def _oaconvolve(data, kernel):
+            kernel = kernel.reshape((1,) * (data.ndim - 1) + (-1,))
+            if mode == 'same' and M > N:
+                # `oaconvolve` keeps `N` samples, `np.convolve` keeps `M`.
+                start = (N - 1) // 2
+                full = oaconvolve(data, kernel, mode='full', axes=-1)
+                return full[..., start:start + M]
+            return oaconvolve(data, kernel, mode=mode, axes=-1)
+
+        # A NaN would spoil the whole FFT block, so convolve the NaN mask
+        # separately and put the NaNs back where `np.convolve` has them.
+        fnan = np.isnan(x)
+        if fnan.any():
+            y = _oaconvolve(np.where(fnan, 0, x), weights)
+            spoiled = _oaconvolve(fnan.astype(dtype),
+                                  np.ones(len(weights), dtype))
+            y[spoiled > 0.5] = np.NaN
+        else:
+            y = _oaconvolve(x, weights)
+
+    return _result(y, out, axis)
+
+
+@_cached_kernel
+def _pl33(dt, T):
+    """PL33 weights for sample interval `dt` and half-amplitude period `T`."""
+    pl33 = np.array(
+        [
+            -0.00027, -0.00114, -0.00211, -0.00317, -0.00427, -0.00537,
+            -0.00641, -0.00735, -0.00811, -0.00864, -0.00887, -0.00872,
+            -0.00816, -0.00714, -0.00560, -0.00355, -0.00097, +0.00213,
+            +0.00574, +0.00980, +0.01425, +0.01902, +0.02400, +0.02911,
+            +0.03423, +0.03923, +0.04399, +0.04842, +0.05237, +0.05576,
+            +0.05850, +0.06051, +0.06174, +0.06215, +0.06174, +0.06051,
+            +0.05850, +0.05576, +0.05237, +0.04842, +0.04399, +0.03923,
+            +0.03423, +0.02911, +0.02400, +0.01902, +0.01425, +0.00980,
+            +0.00574, +0.00213, -0.00097, -0.00355, -0.00560, -0.00714,
+            -0.00816, -0.00872, -0.00887, -0.00864, -0.00811, -0.00735,
+            -0.00641, -0.00537, -0.00427, -0.00317, -0.00211, -0.00114,
+            -0.00027
+        ]
+    )
+
+    _dt = np.linspace(-33, 33, 67)
+
+    dt = float(dt) * (33.0 / T)
+
+    filter_time = np.arange(0.0, 33.0, dt, dtype='d')
+    # N = len(filter_time)
+    filter_time = np.hstack((-filter_time[-1:0:-1], filter_time))
+
+    pl33 = np.interp(filter_time, _dt, pl33)
+    pl33 /= pl33.sum()
+    return pl33
+
+
+def lanc_decimate(x, numwt, haf, step, axis=-1, dtype=None, out=None):
+    """
+    Low-pass filters `x` with the `lanc(numwt, haf)` weights and keeps one
+    output every `step` samples, e.g. hourly values from 1-minute data with
+    `step=60`.  Only the retained outputs are computed, in polyphase form:
+    each of the `step` phases of the input is convolved with the matching
+    `1 / step` of the weights, so the cost is `step` times smaller than
+    filtering at the full rate and subsampling, with no copy of the windows.
+
+    Parameters
+    ----------
+    x : array_like
+        Input data.
+    numwt, haf : int, float
+                 Lanczos filter design, see `lanc`.
+    step : integer
+           Decimation factor.
+    axis : integer
+           Axis along which to filter.  Default is the last axis.
+    dtype : dtype, optional
+            Float dtype of the computation and of the output.  Default is
+            the dtype of `out` or of `x`, float32 inputs stay float32.
+    out : array, optional
+          Array of the decimated shape to store `y` in.
+
+    Returns
+    -------
+    y : array
+        Filtered and decimated data.
+    idx : array
+          Indices of the input samples at the center of each output, the
+          multiples of `step` at which the filter is fully determined.
+
+    Examples
+    --------
+    >>> from oceans.filters import convolve, lanc, lanc_decimate
+    >>> x = np.random.randn(3, 6000)
+    >>> y, idx = lanc_decimate(x, 120, 1./600, 60, axis=1)
+    >>> full = convolve(x, lanc(120, 1./600), axis=1, mode='same')
+    >>> np.allclose(y, full[:, idx])
+    True
+
+    """
+    x = np.asanyarray(x)
+    dtype = _float_dtype(x, dtype, out)
+    x = np.moveaxis(x.astype(dtype, copy=False), axis, -1)
+
+    wt = _lanc(numwt, haf).astype(dtype)
+    M, step = len(wt), int(step)
+
+    N = x.shape[-1]
+
+    # Centers at the multiples of `step` whose window fits in the series.
+    first = -(-(M // 2) // step) * step
+    idx = np.arange(first, N - M // 2, step)
+    nout = len(idx)
+
+    # Polyphase form: the outputs are the sum over the `step` phases of
+    # `x[start + p::step]` correlated with `wt[::-1][p::step]`.
+    y = np.zeros(x.shape[:-1] + (nout,), dtype=dtype)
+    if nout:
+        start = x[..., idx[0] - M // 2:]
+        wr = wt[::-1]
+        for p in range(min(step, M)):
+            wp = wr[p::step]
+            xp = start[..., p::step][..., :nout + len(wp) - 1]
+            y += convolve(xp, wp[::-1], mode='valid', dtype=dtype)
+    return _result(y, out, axis), idx
+
+
+def boxcar(x, n, axis=-1, mode='valid', dtype=None, out=None):
+    """
+    Running mean over `n` points along `axis`, computed from cumulative sums
+    so the cost per sample does not depend on `n`.
+
+    Parameters
+    ----------
+    x : array_like
+        Input data.  Windows holding a NaN are NaN.
+    n : integer
+        Window length in samples.
+    axis : integer
+           Axis along which to filter.  Default is the last axis.
+    mode : str
+           'valid' (default) returns the `N - n + 1` fully determined
+           points, 'same' pads them with NaNs to the input length, aligned
+           like `np.convolve(x, np.ones(n) / n, mode='same')`.
+    dtype : dtype, optional
+            Float dtype of the output.  Default is the dtype of `out` or of
+            `x`, float32 inputs stay float32.  The cumulative sums are
+            always accumulated in double precision.
+    out : array, optional
+          Array of the output shape to store the result in.
+
+    Returns
+    -------
+    y : array
+        Filtered data.
+
+    Examples
+    --------
+    >>> from oceans.filters import boxcar
+    >>> boxcar([1., 2., 3., np.NaN, 5., 6., 7.], 3)
+    array([ 2., nan, nan, nan,  6.])
+
+    """
+    if mode not in ['valid', 'same']:
+        raise ValueError('Invalid mode requested: %s' % mode)
+
+    x = np.asanyarray(x)
+    dtype = _float_dtype(x, dtype, out)
+    x = np.moveaxis(x.astype(dtype, copy=False), axis, -1)
+    y = _running_mean(x, int(n))
+    if mode == 'same':
+        y = _pad_same(y, x.shape[-1], int(n),
+                      _output(out, x.shape, dtype, axis, x=x))
+    return _result(y, out, axis)
+
+
+def godin(x, dt=1.0, axis=-1, mode='valid', windows=(24, 24, 25),
+          dtype=None, out=None):
+    """
+    Godin (1972) tidal low-pass filter, the cascade of running means of 24,
+    24 and 25 hours (`windows`), with sample interval `dt` (hours).  Each
+    running mean costs O(N) whatever its length, see `boxcar`, which makes
+    this a cheap alternative to `pl33tn` for long, high-rate records.
+
+    Parameters
+    ----------
+    x : array_like
+        Input data.  Outputs whose span holds a NaN are NaN.
+    dt : float
+         Sample interval in hours.
+    axis : integer
+           Axis along which to filter.  Default is the last axis.
+    mode : str
+           'valid' (default) or 'same' (NaN padded), see `boxcar`.
+    windows : sequence of float
+              Running mean lengths in hours.
+    dtype : dtype, optional
+            Float dtype of the output, see `boxcar`.
+    out : array, optional
+          Array of the output shape to store the result in.
+
+    Returns
+    -------
+    y : array
+        Filtered data.  In 'valid' mode hourly data loses 35 points at each
+        end.
+
+    Examples
+    --------
+    >>> from oceans.filters import godin
+    >>> t = np.arange(24 * 30)  # Time in hours.
+    >>> x = 2.5 * np.sin(2 * np.pi * t / 12.42) + 0.01 * t
+    >>> low = godin(x, mode='same')
+    >>> np.abs(low - 0.01 * t)[35:-35].max() < 0.05
+    True
+
+    """
+    if mode not in ['valid', 'same']:
+        raise ValueError('Invalid mode requested: %s' % mode)
+
+    x = np.asanyarray(x)
+    dtype = _float_dtype(x, dtype, out)
+    x = np.moveaxis(x.astype(dtype, copy=False), axis, -1)
+    lengths = [int(round(hours / float(dt))) for hours in windows]
+
+    y = x
+    for n in lengths:
+        y = _running_mean(y, n)
+    if mode == 'same':
+        y = _pad_same(y, x.shape[-1], sum(lengths) - len(lengths) + 1,
+                      _output(out, x.shape, dtype, axis, x=x))
+    return _result(y, out, axis)
+
+
+def _running_mean(x, n):
+    """
+    Valid-mode running mean over `n` points along the last axis, with the
+    dtype of `x`.  The cumulative sums are accumulated in double precision.
+
+    """
+    if not 1 <= n <= x.shape[-1]:
+        raise ValueError('Window length must be between 1 and the series '
+                         'length: n = {}, len(x) = {}'.format(n, x.shape[-1]))
+
+    fnan = np.isnan(x)
+    # Removing the mean keeps the round-off of the cumulative sums small.
+    offset = np.mean(np.where(fnan, 0, x), axis=-1, keepdims=True,
+                     dtype=np.float64)
+    zero = np.zeros(x.shape[:-1] + (1,))
+
+    c = np.concatenate((zero, np.cumsum(np.where(fnan, 0, x - offset),
+                                        axis=-1)), axis=-1)
+    y = ((c[..., n:] - c[..., :-n]) / n + offset).astype(x.dtype,
+                                                         copy=False)
+
+    if fnan.any():
+        c = np.concatenate((zero, np.cumsum(fnan, axis=-1)), axis=-1)
+        y[c[..., n:] - c[..., :-n] > 0] = np.NaN
     return y
 
 
-def pl33tn(x, dt=1.0, T=33.0, mode='valid'):
+def _pad_same(y, N, M, out=None):
+    """
+    Pads the valid-mode output `y` of an `M` points kernel with NaNs to
+    the input length `N`, aligned like `np.convolve(..., mode='same')`,
+    in `out` if given.
+
+    """
+    if out is None:
+        out = np.empty(y.shape[:-1] + (N,), y.dtype)
+    left, right = M // 2, M // 2 + y.shape[-1]
+    out[..., :left] = out[..., right:] = np.NaN
+    out[..., left:right] = y
+    return out
+
+
+def pl33tn(x, dt=1.0, T=33.0, mode='valid', axis=-1, method='auto',
+           maxgap=None, dtype=None, out=None):
     """
     Computes low-passed series from `x` using pl33 filter, with optional
     sample interval `dt` (hours) and filter half-amplitude period T (hours)
@@ -599,6 +1780,19 @@ def pl33tn(x, dt=1.0, T=33.0, mode='valid'):
     and cosine tapered at each end to return a filtered time series
     xf of the same length.  Assumes length of x greater than 67.
 
+    N-D arrays are filtered along `axis`.  The kernel gets long for short
+    `dt` (about 4000 taps for 1-minute data) and `method='auto'` switches
+    from direct to FFT overlap-add convolution for long kernels, see
+    `convolve`.
+
+    If `maxgap` is given, the series with NaN gaps is filtered segment by
+    segment after interpolating gaps of at most `maxgap` points, see
+    `gapfilter`.  The output then has the same length as `x` regardless of
+    `mode`.
+
+    The output has the float dtype `dtype`, by default that of `out` or of
+    `x` (float32 stays float32), and is stored in `out` if given.
+
     Examples
     --------
     >>> from oceans.filters import pl33tn
@@ -620,36 +1814,104 @@ def pl33tn(x, dt=1.0, T=33.0, mode='valid'):
 
     """
 
-    pl33 = np.array(
-        [
-            -0.00027, -0.00114, -0.00211, -0.00317, -0.00427, -0.00537,
-            -0.00641, -0.00735, -0.00811, -0.00864, -0.00887, -0.00872,
-            -0.00816, -0.00714, -0.00560, -0.00355, -0.00097, +0.00213,
-            +0.00574, +0.00980, +0.01425, +0.01902, +0.02400, +0.02911,
-            +0.03423, +0.03923, +0.04399, +0.04842, +0.05237, +0.05576,
-            +0.05850, +0.06051, +0.06174, +0.06215, +0.06174, +0.06051,
-            +0.05850, +0.05576, +0.05237, +0.04842, +0.04399, +0.03923,
-            +0.03423, +0.02911, +0.02400, +0.01902, +0.01425, +0.00980,
-            +0.00574, +0.00213, -0.00097, -0.00355, -0.00560, -0.00714,
-            -0.00816, -0.00872, -0.00887, -0.00864, -0.00811, -0.00735,
-            -0.00641, -0.00537, -0.00427, -0.00317, -0.00211, -0.00114,
-            -0.00027
-        ]
-    )
+    pl33 = _pl33(dt, T)
+    if maxgap is not None:
+        return gapfilter(x, pl33, maxgap=maxgap, axis=axis, method=method,
+                         dtype=dtype, out=out)
+    xf = convolve(x, pl33, axis=axis, mode=mode, method=method, dtype=dtype,
+                  out=out)
+    return xf
 
-    _dt = np.linspace(-33, 33, 67)
 
-    dt = float(dt) * (33.0 / T)
+@_cached_kernel
+def _godin(dt, windows):
+    """Godin weights, the convolution of the `windows` running means."""
+    kernel = np.ones(1)
+    for hours in windows:
+        n = int(round(hours / float(dt)))
+        kernel = np.convolve(kernel, np.ones(n) / n)
+    return kernel
 
-    filter_time = np.arange(0.0, 33.0, dt, dtype='d')
-    # N = len(filter_time)
-    filter_time = np.hstack((-filter_time[-1:0:-1], filter_time))
 
-    pl33 = np.interp(filter_time, _dt, pl33)
-    pl33 /= pl33.sum()
+@_cached_kernel
+def _response(weights, nfft, dt):
+    """
+    Frequencies, amplitude and phase of the weights (given as float64
+    bytes) from a single zero-padded rFFT, with the phase referred to the
+    center of the kernel.
+
+    """
+    weights = np.frombuffer(weights)
+    freq = np.fft.rfftfreq(nfft, dt)
+    H = np.fft.rfft(weights, nfft)
+    H *= np.exp(2j * np.pi * freq * dt * (len(weights) - 1) / 2.)
+    return np.vstack((freq, np.abs(H), np.angle(H)))
+
+
+def frequency_response(kernel, dt=1.0, nfft=None, **design):
+    """
+    Amplitude and phase response of a filter kernel on a dense frequency
+    grid, e.g. to choose the `pl33tn`, `lanc` or `md_trenberth` parameters
+    without trial runs.  The response comes from a single zero-padded rFFT
+    and is cached for each kernel.
+
+    Parameters
+    ----------
+    kernel : array or str
+             Filter weights or the name of a filter: 'pl33tn' (design
+             parameter `T`), 'lanc' (`numwt` and `haf`), 'md_trenberth',
+             'godin' (`windows`) or 'boxcar' (`n`).
+    dt : float
+         Sample interval, in hours for 'pl33tn' and 'godin'.  The
+         frequencies are in cycles per unit of `dt`.
+    nfft : int, optional
+           FFT length, sets the frequency resolution.  Default is the
+           power of 2 at least 8 times the kernel length, and no less than
+           4096.  Must not be shorter than the kernel.
+    design : Filter design parameters for named kernels.
+
+    Returns
+    -------
+    freq : array
+           Frequencies from 0 to the Nyquist frequency.
+    amplitude : array
+                Amplitude response.
+    phase : array
+            Phase response in radians, relative to the kernel center.
+            Symmetric kernels have zero phase (or pi where the response is
+            negative).
+
+    Examples
+    --------
+    >>> from oceans.filters import frequency_response
+    >>> freq, amp, phase = frequency_response('pl33tn', dt=1.0, T=33.0)
+    >>> half = freq[np.argmin(np.abs(amp - 0.5))]
+    >>> bool(abs(1 / half - 33) < 1)
+    True
+
+    """
+    if isinstance(kernel, str):
+        designs = {'pl33tn': lambda T=33.0: _pl33(dt, T),
+                   'lanc': lambda numwt, haf: _lanc(numwt, haf),
+                   'md_trenberth': lambda: _trenberth,
+                   'godin': lambda windows=(24, 24, 25): _godin(
+                       dt, tuple(windows)),
+                   'boxcar': lambda n: np.ones(int(n)) / int(n)}
+        if kernel not in designs:
+            raise ValueError('Invalid kernel requested: %s' % kernel)
+        kernel = designs[kernel](**design)
+
+    weights = np.asarray(kernel, dtype=np.float64)
+    if nfft is None:
+        nfft = max(4096, 2 ** int(np.ceil(np.log2(8 * len(weights)))))
+    if nfft < len(weights):
+        msg = 'nfft must be >= the kernel length: nfft = {0:d}, len(kernel) = {1:d}'.format  # noqa
+        raise ValueError(msg(int(nfft), len(weights)))
+
+    freq, amplitude, phase = _response(weights.tobytes(), int(nfft),
+                                       float(dt))
+    return freq, amplitude, phase
 
-    xf = np.convolve(x, pl33, mode=mode)
-    return xf
 
 if __name__ == '__main__':
     import doctest
@@ -0,0 +1,448 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (absolute_import, division, print_function)
+
+import numpy as np
+
+from .filters import _float_dtype, _lanc, _pl33, _trenberth, convolve
+
+
+class StreamingFilter(object):
+    """
+    Applies the filter `weights` to a series that arrives in chunks, e.g.
+    mooring telemetry.  Only the last `len(weights) - 1` samples are kept
+    between calls, and every output is emitted as soon as the kernel span
+    behind it has arrived.  The concatenated outputs are the same as
+    `convolve(x, weights, mode='valid')` of the concatenated chunks.
+
+    Parameters
+    ----------
+    weights : 1D array
+              Filter weights.
+    axis : integer
+           Time axis of the chunks.  Default is the last axis.
+    method : str
+             Convolution method, see `convolve`.
+
+    Examples
+    --------
+    >>> from oceans.filters import StreamingPL33, pl33tn
+    >>> x = np.random.randn(1000)
+    >>> sf = StreamingPL33(dt=1.0)
+    >>> xf = np.concatenate([sf.update(chunk) for chunk in
+    ...                      np.array_split(x, 7)])
+    >>> np.allclose(xf, pl33tn(x, dt=1.0))
+    True
+
+    """
+    def __init__(self, weights, axis=-1, method='auto'):
+        self.weights = np.asarray(weights)
+        self.axis = axis
+        self.method = method
+        self.reset()
+
+    @property
+    def delay(self):
+        """Number of samples between the newest input and the newest
+        output."""
+        return len(self.weights) // 2
+
+    def reset(self):
+        """Forgets the samples kept from previous chunks."""
+        self._tail = None
+
+    def update(self, chunk):
+        """
+        Filters the new `chunk` and returns the outputs it completes,
+        possibly none.
+
+        """
+        chunk = np.moveaxis(np.asanyarray(chunk), self.axis, -1)
+        if self._tail is not None:
+            chunk = np.concatenate((self._tail, chunk), axis=-1)
+
+        nkeep = len(self.weights) - 1
+        if chunk.shape[-1] <= nkeep:
+            # A copy, the caller may reuse the buffer of `chunk`.
+            self._tail = chunk.copy()
+            y = np.empty(chunk.shape[:-1] + (0,), _float_dtype(chunk))
+        else:
+            y = convolve(chunk, self.weights, mode='valid',
+                         method=self.method)
+            self._tail = chunk[..., chunk.shape[-1] - nkeep:].copy()
+        return np.moveaxis(y, -1, self.axis)
+
+
+class StreamingPL33(StreamingFilter):
+    """
+    Streaming version of `pl33tn` with sample interval `dt` (hours) and
+    half-amplitude period `T` (hours).  See `StreamingFilter`.
+
+    """
+    def __init__(self, dt=1.0, T=33.0, axis=-1, method='auto'):
+        super(StreamingPL33, self).__init__(_pl33(dt, T), axis=axis,
+                                            method=method)
+
+
+class StreamingLanczos(StreamingFilter):
+    """
+    Streaming Lanczos low-pass filter with the `lanc(numwt, haf)` weights.
+    See `StreamingFilter`.
+
+    """
+    def __init__(self, numwt, haf, axis=-1, method='auto'):
+        super(StreamingLanczos, self).__init__(_lanc(numwt, haf), axis=axis,
+                                               method=method)
+
+
+class StreamingTrenberth(StreamingFilter):
+    """
+    Streaming version of `md_trenberth`.  See `StreamingFilter`.
+
+    """
+    def __init__(self, axis=-1, method='auto'):
+        super(StreamingTrenberth, self).__init__(_trenberth, axis=axis,
+                                                 method=method)
+
+
+class _CausalFilter(object):
+    """
+    Base class of the causal (one-sided) filters.  Keeps a ring buffer with
+    the last `L` samples of each of the `nchannels` channels, of the float
+    `dtype`.
+
+    """
+    def __init__(self, L, nchannels=1, dtype=np.float64):
+        self.L = int(L)
+        self.nchannels = int(nchannels)
+        if self.L < 1:
+            raise ValueError('Window length must be >= 1.')
+        self.dtype = _float_dtype(None, dtype)
+
+        self._buf = np.empty((self.nchannels, self.L), self.dtype)
+        self._old = np.empty(self.nchannels, self.dtype)
+        self._new = np.empty(self.nchannels, self.dtype)
+        self.output = np.empty(self.nchannels, self.dtype)
+        self.reset()
+
+    def reset(self):
+        """Forgets all the samples received so far."""
+        self._buf.fill(np.NaN)
+        self.output.fill(np.NaN)
+        self._pos = 0
+
+    def update(self, values):
+        """
+        Feeds one new sample per channel, a scalar or an array of shape
+        (nchannels,), and returns the filtered values in `self.output`.
+        That array is overwritten by the next update, copy it to keep it.
+
+        A block of shape (nsamples, nchannels) is fed one sample at a time
+        and returns a new (nsamples, nchannels) array.  The outputs have the
+        `dtype` given to the filter, float64 by default.
+
+        """
+        if np.isscalar(values):
+            self._new.fill(values)
+            return self._push(self._new)
+        if not (isinstance(values, np.ndarray) and
+                values.dtype == self.dtype):
+            values = np.asarray(values, dtype=self.dtype)
+        if values.ndim == 2:
+            out = np.empty(values.shape, self.dtype)
+            for k, v in enumerate(values):
+                out[k] = self._push(v)
+            return out
+        return self._push(values)
+
+    def _push(self, v):
+        np.copyto(self._old, self._buf[:, self._pos])
+        self._buf[:, self._pos] = v
+        self._update(self._buf[:, self._pos], self._old)
+        self._pos = (self._pos + 1) % self.L
+        return self.output
+
+    def _update(self, new, old):
+        raise NotImplementedError
+
+
+class CausalMean(_CausalFilter):
+    """
+    Causal running mean of the last `L` samples of `nchannels` channels,
+    ignoring NaNs, updated in O(1) per sample from running sums.
+
+    Examples
+    --------
+    >>> from oceans.filters import CausalMean
+    >>> cm = CausalMean(3, nchannels=2)
+    >>> cm.update([[1., 10.], [2., np.NaN], [3., 30.], [4., 40.]])
+    array([[ 1. , 10. ],
+           [ 1.5, 10. ],
+           [ 2. , 20. ],
+           [ 3. , 35. ]])
+
+    """
+    def reset(self):
+        super(CausalMean, self).reset()
+        self._sum = np.zeros(self.nchannels)
+        self._count = np.zeros(self.nchannels)
+        self._valid = np.empty(self.nchannels, dtype=bool)
+        self._positive = np.empty(self.nchannels, dtype=bool)
+
+    def _update(self, new, old):
+        valid, positive = self._valid, self._positive
+
+        np.isnan(old, out=valid)
+        np.logical_not(valid, out=valid)
+        np.subtract(self._sum, old, out=self._sum, where=valid)
+        np.subtract(self._count, valid, out=self._count)
+
+        np.isnan(new, out=valid)
+        np.logical_not(valid, out=valid)
+        np.add(self._sum, new, out=self._sum, where=valid)
+        np.add(self._count, valid, out=self._count)
+
+        if self._pos == self.L - 1:
+            # Re-summing once per cycle stops the round-off from drifting.
+            np.nansum(self._buf, axis=1, out=self._sum)
+
+        np.greater(self._count, 0, out=positive)
+        self.output.fill(np.NaN)
+        np.divide(self._sum, self._count, out=self.output, where=positive)
+
+
+class CausalWeim(_CausalFilter):
+    """
+    Causal version of `weim`: the NaN-aware weighted mean of the last `N`
+    samples of `nchannels` channels with the window `kind` of size `N`.
+    The output at a given sample is the `weim` value `N // 2` samples
+    earlier, computed with past data only, and NaN when that earlier sample
+    is NaN.  Each update costs one dot product of length `N` per channel.
+
+    Examples
+    --------
+    >>> from oceans.filters import CausalWeim, weim
+    >>> x = np.random.randn(200)
+    >>> cw = CausalWeim(11, kind='hamming')
+    >>> y = cw.update(x[:, None])[:, 0]
+    >>> np.allclose(y[10:], weim(x, 11, kind='hamming')[5:-5])
+    True
+
+    """
+    def __init__(self, N, kind='hann', badflag=-9999, beta=14, nchannels=1,
+                 dtype=np.float64):
+        from .filters import _weim_window
+
+        w = _weim_window(kind, N, beta)
+        self._wring = np.r_[w, w]
+        self.badflag = badflag
+        super(CausalWeim, self).__init__(N, nchannels=nchannels, dtype=dtype)
+
+    def reset(self):
+        super(CausalWeim, self).reset()
+        self._data = np.zeros((self.nchannels, self.L))
+        self._valid = np.zeros((self.nchannels, self.L))
+        self._isnan = np.zeros((self.nchannels, self.L), dtype=bool)
+        self._num = np.empty(self.nchannels)
+        self._den = np.empty(self.nchannels)
+        self._positive = np.empty(self.nchannels, dtype=bool)
+        self._bad = np.empty(self.nchannels, dtype=bool)
+
+    def _update(self, new, old):
+        pos, ok, bad = self._pos, self._positive, self._bad
+
+        # Eliminating NaNs and bad data from the mean computation.
+        np.isnan(new, out=bad)
+        np.copyto(self._isnan[:, pos], bad)
+        np.equal(new, self.badflag, out=ok)
+        np.logical_or(bad, ok, out=bad)
+        np.logical_not(bad, out=ok)
+        np.copyto(self._valid[:, pos], ok)
+        self._data[:, pos] = 0
+        np.copyto(self._data[:, pos], new, where=ok)
+
+        # Oldest sample gets the first weight and the newest the last one.
+        w = self._wring[self.L - pos - 1:2 * self.L - pos - 1]
+        np.dot(self._data, w, out=self._num)
+        np.dot(self._valid, w, out=self._den)
+
+        np.greater(self._den, 0, out=self._positive)
+        self.output.fill(np.NaN)
+        np.divide(self._num, self._den, out=self.output, where=self._positive)
+        # Like `weim`, NaN where the centre sample is NaN.
+        np.copyto(self.output, np.NaN,
+                  where=self._isnan[:, (pos - self.L // 2) % self.L])
+
+
+class CausalMedian(_CausalFilter):
+    """
+    Causal running median of the last `L` samples of `nchannels` channels,
+    ignoring NaNs.  The windows of all the channels are kept as the rows of
+    a preallocated sorted (nchannels, L) array, NaNs last.  Each sample
+    finds the oldest value and the place of the new one with a binary
+    search of all the rows at once, O(log L), then moves the values between
+    the two places by one, without sorting.  That move is O(L) per channel
+    at worst, a memmove of at most `L` values.
+
+    Moves of up to 256 values per channel on average are gathered for all
+    the channels at once in preallocated buffers, so a sample allocates no
+    arrays.  Longer moves are done row by row, where NumPy copies each
+    overlapping slice through a temporary.
+
+    Examples
+    --------
+    >>> from oceans.filters import CausalMedian
+    >>> cm = CausalMedian(3)
+    >>> [float(cm.update(v)[0]) for v in [1., 100., 2., np.NaN, 3.]]
+    [1.0, 50.5, 2.0, 51.0, 2.5]
+
+    """
+    def reset(self):
+        super(CausalMedian, self).reset()
+        nch, L = self.nchannels, self.L
+        self._sorted = np.full((nch, L), np.NaN, self.dtype)
+        self._count = np.zeros(nch, dtype=np.intp)  # Valid values.
+        self._offsets = np.arange(0, nch * L, L)
+        # The old and the new values are searched as one batch.
+        self._keys = np.empty(2 * nch, self.dtype)
+        self._starts = np.concatenate((self._offsets, self._offsets))
+        self._rank = np.empty(2 * nch, dtype=np.intp)
+        self._probe = np.empty(2 * nch, dtype=np.intp)
+        self._half = np.empty(2 * nch, dtype=np.intp)
+        self._values = np.empty(2 * nch, self.dtype)
+        self._less = np.empty(2 * nch, dtype=bool)
+        self._index = np.empty(nch, dtype=np.intp)
+        self._nan = np.empty(nch, dtype=bool)
+        # The moves: per channel, then per moved value.
+        self._up = np.empty(nch, dtype=bool)
+        self._length = np.empty(nch, dtype=np.intp)
+        self._first = np.empty(nch, dtype=np.intp)
+        self._code = np.empty(nch, dtype=np.intp)
+        self._diff = np.empty(nch, dtype=np.intp)
+        size = 256 * nch
+        self._steps = np.arange(size)
+        self._jumps = np.empty(size + 1, dtype=np.intp)
+        self._dst = np.empty(size, dtype=np.intp)
+        self._src = np.empty(size, dtype=np.intp)
+        self._moved = np.empty(size, self.dtype)
+
+    def _search(self, flat):
+        """
+        Number of values smaller than each of `self._keys` in its sorted
+        row, a branchless binary search.  NaNs are never smaller.
+
+        """
+        rank, probe, values, less, half = (self._rank, self._probe,
+                                           self._values, self._less,
+                                           self._half)
+        rank.fill(0)
+        size = self.L
+        while size > 1:
+            step = size // 2
+            np.add(self._starts, rank, out=probe)
+            probe += step - 1
+            flat.take(probe, out=values)
+            np.less(values, self._keys, out=less)
+            np.multiply(less, step, out=half)
+            rank += half
+            size -= step
+        np.add(self._starts, rank, out=probe)
+        flat.take(probe, out=values)
+        np.less(values, self._keys, out=less)
+        rank += less
+        return rank
+
+    def _repeat(self, values, total, out):
+        """
+        `np.repeat(values, self._length)` into `out[:total]`, as the running
+        sum of the jumps between the runs.
+
+        """
+        jumps, diff = self._jumps[:total + 1], self._diff
+        jumps.fill(0)
+        diff[0] = values[0]
+        np.subtract(values[1:], values[:-1], out=diff[1:])
+        # Empty runs share the start of the next one, their jumps add up.
+        np.add.at(jumps, self._first, diff)
+        return np.cumsum(jumps[:total], out=out[:total])
+
+    def _update(self, new, old):
+        flat, n, index, nan = (self._sorted.ravel(), self._count,
+                               self._index, self._nan)
+        nch, L = self.nchannels, self.L
+        up, length = self._up, self._length
+
+        self._keys[:nch] = old
+        self._keys[nch:] = new
+        rank = self._search(flat)
+
+        # The oldest value is at the number of smaller ones, a NaN at L - 1.
+        i = rank[:nch]
+        np.isnan(old, out=nan)
+        np.copyto(i, L - 1, where=nan)
+        np.add(n, nan, out=n)
+        # Once the oldest value is removed the new one goes after the
+        # smaller ones, a NaN at L - 1.
+        j = rank[nch:]
+        np.less(old, new, out=up)
+        np.subtract(j, up, out=j)
+        np.isnan(new, out=nan)
+        np.copyto(j, L - 1, where=nan)
+        np.subtract(n, nan, out=n)
+
+        # The values between i and j move one place towards i.
+        np.subtract(j, i, out=length)
+        np.less(i, j, out=up)
+        np.absolute(length, out=length)
+        total = length.sum()
+        if 0 < total <= len(self._steps):
+            # Short moves, gathered for all the channels at once.  Channel
+            # k moves `length_k` values to start_k, start_k + 1, ... from
+            # one place up or down.  Its start less the place of its run
+            # among the moved values, and whether it moves up, are packed
+            # in one integer so a single running sum expands them.
+            code, first = self._code, self._first
+            np.add(j, 1, out=code)
+            np.copyto(code, i, where=up)
+            code += self._offsets
+            np.cumsum(length, out=first)
+            first -= length
+            code -= first
+            code *= 2
+            code += up
+            packed = self._repeat(code, total, self._src)
+            dst, src = self._dst[:total], packed
+            np.right_shift(packed, 1, out=dst)
+            dst += self._steps[:total]
+            # src = dst + 1 up and dst - 1 down.
+            np.bitwise_and(packed, 1, out=src)
+            src *= 2
+            src -= 1
+            src += dst
+            moved = self._moved[:total]
+            flat.take(src, out=moved)
+            flat[dst] = moved
+        elif total:
+            for row, a, b in zip(self._sorted, i, j):
+                if a < b:
+                    row[a:b] = row[a + 1:b + 1]
+                elif b < a:
+                    row[b + 1:a + 1] = row[b:a]
+        np.add(j, self._offsets, out=index)
+        flat[index] = new
+
+        # Median of the `n` valid values at the start of each row.
+        lo = self._values[:nch]
+        np.subtract(n, 1, out=index)
+        np.maximum(index, 0, out=index)
+        np.floor_divide(index, 2, out=index)
+        np.add(index, self._offsets, out=index)
+        flat.take(index, out=lo)
+        np.floor_divide(n, 2, out=index)
+        np.minimum(index, L - 1, out=index)
+        np.add(index, self._offsets, out=index)
+        flat.take(index, out=self.output)
+        np.add(self.output, lo, out=self.output)
+        np.multiply(self.output, 0.5, out=self.output)
+        np.equal(n, 0, out=nan)
+        np.copyto(self.output, np.NaN, where=nan)
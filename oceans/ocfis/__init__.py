@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 
-from .synop import scaloa
+from .synop import ObjectiveAnalysis, scaloa, scaloa_local, scaloa_tiled
 from .ocfis import (
     bin_dates,
     binave,
@@ -8,6 +8,7 @@ from .ocfis import (
     complex_demodulation,
     del_eta_del_x,
     despike,
+    hampel,
     lagcorr,
     mld,
     pcaben,
@@ -33,6 +34,7 @@ __all__ = [
     'complex_demodulation',
     'del_eta_del_x',
     'despike',
+    'hampel',
     'lagcorr',
     'mld',
     'pcaben',
@@ -49,4 +51,7 @@ __all__ = [
     'strip_mask',
     'shiftdim',
     'scaloa',
+    'scaloa_local',
+    'scaloa_tiled',
+    'ObjectiveAnalysis',
     ]
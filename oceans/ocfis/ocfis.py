@@ -370,48 +370,79 @@ def spec_rot(u, v):
     return puv, quv, cw, ccw, F
 
 
-def lagcorr(x, y, M=None):
+def lagcorr(x, y, M=None, axis=0):
     """
     Compute lagged correlation between two series.
     Follow emery and Thomson book "summation" notation.
 
     Parameters
     ----------
+    x : array
+        time-series, or 2D array of time-series (e.g. every instrument of
+        a mooring) along `axis`
     y : array
-        time-series
-    y : array
-        time-series
+        time-series, or 2D array of time-series along `axis`
     M : integer
         number of lags
+    axis : integer
+           time axis of `x` and `y`
 
     Returns
     -------
     Cxy : array
-          normalized cross-correlation function
+          normalized cross-correlation function, with shape (M,) for two
+          series.  For 2D arrays of p and q series it has shape (M, p, q)
+          and `Cxy[:, i, j]` correlates `x` series i with `y` series j.
+
+    Notes
+    -----
+    The lagged sums are computed for all the lags and series pairs at once
+    with FFTs, O(N log N) instead of O(N * M).
 
     Examples
     --------
-    TODO: Implement Emery and Thomson example.
+    >>> from oceans.ocfis import lagcorr
+    >>> t = np.arange(1000)
+    >>> y = np.sin(2 * np.pi * t / 50.)
+    >>> x = np.roll(y, 5)  # x lags y by 5 samples.
+    >>> int(np.argmax(lagcorr(x, y, M=25)))
+    5
+    >>> mooring = np.c_[y, x, np.cos(2 * np.pi * t / 50.)]  # (time, 3)
+    >>> lagcorr(mooring, mooring, M=25).shape
+    (25, 3, 3)
 
     """
+    from scipy.fftpack import next_fast_len
 
     x, y = list(map(np.asanyarray, (x, y)))
+    x, y = np.moveaxis(x, axis, 0), np.moveaxis(y, axis, 0)
 
-    if not M:
-        M = x.size
+    N = x.shape[0]
+    if y.shape[0] != N:
+        raise ValueError('x and y must have the same length: '
+                         '{} != {}'.format(N, y.shape[0]))
 
-    N = x.size
-    Cxy = np.zeros(M)
-    x_bar, y_bar = x.mean(), y.mean()
+    if not M:
+        M = N
+    if M > N:
+        raise ValueError('Number of lags must be at most the series length: '
+                         'M = {}, N = {}'.format(M, N))
 
-    for k in range(0, M, 1):
-        a = 0.
-        for i in range(N - k):
-            a = a + (y[i] - y_bar) * (x[i + k] - x_bar)
+    # Anomalies of every series, as (N, p) and (N, q) arrays.
+    xa = (x - x.mean(axis=0)).reshape(N, -1)
+    ya = (y - y.mean(axis=0)).reshape(N, -1)
 
-        Cxy[k] = 1. / (N - k) * a
+    # Sum over i of y[i] * x[i + k], zero padded so the lags do not wrap
+    # around.
+    nfft = next_fast_len(N + M - 1)
+    X = np.fft.rfft(xa, nfft, axis=0)
+    Y = np.fft.rfft(ya, nfft, axis=0)
+    a = np.fft.irfft(X[:, :, None] * Y.conj()[:, None, :], nfft,
+                     axis=0)[:M]
 
-    return Cxy / (np.std(y) * np.std(x))
+    Cxy = a / (N - np.arange(M))[:, None, None]
+    Cxy /= (xa.std(axis=0)[:, None] * ya.std(axis=0)[None, :])
+    return Cxy.reshape((M,) + x.shape[1:] + y.shape[1:])
 
 
 def complex_demodulation(series, f, fc, axis=-1):
@@ -624,6 +655,115 @@ def despike(self, n=3, recursive=False):
     return Series(result, index=self.index, name=self.name)
 
 
+def hampel(x, L=7, n=3, axis=None, replace=False):
+    """
+    Hampel despiker.  Flags the points that are more than `n` scaled rolling
+    MADs away from the rolling median of the `L` points window around them.
+    Unlike `despike`, the statistics are local and computed in a single
+    vectorized pass.
+
+    Parameters
+    ----------
+    x : array_like, Series or DataFrame
+        Input data.
+    L : integer
+        Window length, see `oceans.filters.medfilt1`.
+    n : float
+        Threshold in number of scaled MADs (1.4826 * MAD, the standard
+        deviation for Gaussian data).
+    axis : integer, optional
+           Axis along which to despike.  Default is the last axis for arrays
+           and the index (axis 0) for pandas objects.
+    replace : bool
+              Replace the spikes with the rolling median instead of NaN.
+
+    Returns
+    -------
+    outliers : array_like
+               Boolean mask of the spikes, same type and shape as `x`.
+    cleaned : array_like
+              `x` with the spikes replaced.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> from oceans.ocfis import hampel
+    >>> x = np.sin(np.linspace(0, 10, 200)) + 0.1 * np.random.randn(200)
+    >>> x[[20, 120]] = 5.
+    >>> outliers, cleaned = hampel(x, L=15)
+    >>> bool(outliers[[20, 120]].all()), bool(np.isnan(cleaned[20]))
+    (True, True)
+
+    Notes
+    -----
+    The median of each window and the MAD, the median of the absolute
+    deviations of all its points from that median, skip the NaNs, so the
+    points next to a gap are still tested.  The windows shrink at the edges
+    as in `oceans.filters.medfilt1`.
+
+    """
+    is_pandas = hasattr(x, 'iloc')  # Lists have an `index` method.
+    values = x.values if is_pandas else x
+    if axis is None:
+        axis = 0 if is_pandas else -1
+    values = np.asanyarray(values, dtype=float)
+
+    med, mad = _rolling_median_mad(values, L, axis)
+    deviation = np.abs(values - med)
+    mad *= 1.4826
+
+    with np.errstate(invalid='ignore'):
+        outliers = deviation > n * mad
+
+    cleaned = values.copy()
+    cleaned[outliers] = med[outliers] if replace else np.NaN
+
+    if is_pandas:  # Series and DataFrames.
+        outliers = x.__class__(outliers, index=x.index,
+                               **_pandas_labels(x))
+        cleaned = x.__class__(cleaned, index=x.index, **_pandas_labels(x))
+    return outliers, cleaned
+
+
+def _rolling_median_mad(x, L, axis):
+    """
+    NaN-aware median of each `L` points window of `x` along `axis` and the
+    median absolute deviation of the window points from it.  The windows
+    are taken in blocks of outputs to bound the memory.
+
+    """
+    from numpy.lib.stride_tricks import sliding_window_view
+
+    Lwing = (int(L) | 1) // 2
+    x = np.moveaxis(x, axis, -1)
+    # NaNs pad the edges, where `nanmedian` shrinks the windows.
+    pad = [(0, 0)] * (x.ndim - 1) + [(Lwing, Lwing)]
+    padded = np.pad(x, pad, mode='constant', constant_values=np.NaN)
+    windows = sliding_window_view(padded, 2 * Lwing + 1, axis=-1)
+
+    med = np.empty(x.shape)
+    mad = np.empty(x.shape)
+    N = x.shape[-1]
+    nseries = x.size // N if N else 1
+    step = max(1, 2 ** 22 // (nseries * (2 * Lwing + 1)))
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # All-NaN windows.
+        for i0 in range(0, N, step):
+            i1 = min(i0 + step, N)
+            block = windows[..., i0:i1, :]
+            med[..., i0:i1] = np.nanmedian(block, axis=-1)
+            deviation = np.abs(block - med[..., i0:i1, None])
+            mad[..., i0:i1] = np.nanmedian(deviation, axis=-1)
+    return np.moveaxis(med, -1, axis), np.moveaxis(mad, -1, axis)
+
+
+def _pandas_labels(x):
+    """Name of a Series or columns of a DataFrame."""
+    if hasattr(x, 'columns'):
+        return dict(columns=x.columns)
+    return dict(name=x.name)
+
+
 def pol2cart(theta, radius, units='deg'):
     """
     Convert from polar to Cartesian coordinates
@@ -5,7 +5,8 @@ from __future__ import (absolute_import, division, print_function)
 import numpy as np
 
 
-def scaloa(xc, yc, x, y, t=None, corrlen=None, err=None, zc=None):
+def scaloa(xc, yc, x, y, t=None, corrlen=None, err=None, zc=None,
+           blocksize=4096):
     """
     Scalar objective analysis.  Interpolates t(x, y) into tp(xc, yc)
     Assumes spatial correlation function to be isotropic and Gaussian in the
@@ -18,6 +19,10 @@ def scaloa(xc, yc, x, y, t=None, corrlen=None, err=None, zc=None):
               Correlation length.
     err     : float
               Random error variance (epsilon in the papers).
+    blocksize : int
+                Number of grid points evaluated at a time.  Bounds the
+                memory use to about `n**2 + blocksize * n` floats for `n`
+                observations.
 
     Return
     ------
@@ -39,54 +44,592 @@ def scaloa(xc, yc, x, y, t=None, corrlen=None, err=None, zc=None):
 
     """
 
-    n = len(x)
-    x, y = np.reshape(x, (1, n)), np.reshape(y, (1, n))
+    oa = ObjectiveAnalysis(xc, yc, x, y, corrlen, err, blocksize=blocksize,
+                           cachesize=0)
 
-    # Squared distance matrix between the observations.
-    d2 = ((np.tile(x, (n, 1)).T - np.tile(x, (n, 1))) ** 2 +
-          (np.tile(y, (n, 1)).T - np.tile(y, (n, 1))) ** 2)
+    # Gauss-Markov to get the weights that minimize the variance (OI).
+    # NOTE: `scaloa2.m` removes the mean mD = sum(A^-1 t) / sum(A^-1) before
+    # mapping and adds it back to tp.
+    tp = None
+    if t is not None:
+        tp = oa.map(np.reshape(t, (len(oa.x), 1)))
+    else:
+        print('Computing just the interpolation errors.')
+
+    return tp, oa.ep
 
-    nv = len(xc)
-    xc, yc = np.reshape(xc, (1, nv)), np.reshape(yc, (1, nv))
 
-    # Squared distance between the observations and the grid points.
-    dc2 = ((np.tile(xc, (n, 1)).T - np.tile(x, (nv, 1))) ** 2 +
-           (np.tile(yc, (n, 1)).T - np.tile(y, (nv, 1))) ** 2)
+class ObjectiveAnalysis(object):
+    """
+    Scalar objective analysis of any number of fields observed at the same
+    stations (x, y), mapped into the same grid points (xc, yc), see
+    `scaloa`.
+
+    The correlation matrix between the stations is Cholesky factored once,
+    when the object is created, or LU factored when it is not numerically
+    positive definite (e.g. `err=0` with near duplicate stations).  Each call
+    to `map` solves all the fields with one batch of solves, and the
+    normalized mean error `ep`, which does not depend on the data, is
+    computed only once.
 
-    # Correlation matrix between stations (A) and cross correlation (stations
-    # and grid points (C)).
-    A = (1 - err) * np.exp(-d2 / corrlen ** 2)
-    C = (1 - err) * np.exp(-dc2 / corrlen ** 2)
+    Parameters
+    ----------
+    xc, yc : array_like
+             Grid points.
+    x, y : array_like
+           Station positions.
+    corrlen : float
+              Correlation length.
+    err : float
+          Random error variance (epsilon in the papers).
+    blocksize : int
+                Number of grid points evaluated at a time.
+    cachesize : int
+                The cross correlations between the grid points and the
+                stations are kept in memory, and reused by every `map`,
+                when they take at most `cachesize` bytes.  Otherwise they
+                are recomputed in blocks each time.
 
-    if 0:  # NOTE: If the parameter zc is used (`scaloa2.m`)
-        A = (1 - d2 / zc ** 2) * np.exp(-d2 / corrlen ** 2)
-        C = (1 - dc2 / zc ** 2) * np.exp(-dc2 / corrlen ** 2)
+    Examples
+    --------
+    >>> from oceans.ocfis import ObjectiveAnalysis, scaloa
+    >>> x, y = 10 * np.random.rand(2, 100)
+    >>> T, S = 20 + np.sin(x), 35 + 0.1 * np.cos(y)
+    >>> xc, yc = [g.ravel() for g in np.mgrid[0:10:21j, 0:10:21j]]
+    >>> oa = ObjectiveAnalysis(xc, yc, x, y, corrlen=1.5, err=0.1)
+    >>> tp = oa.map(np.c_[T, S])  # One column per field.
+    >>> tp.shape
+    (441, 2)
+    >>> tp0, ep0 = scaloa(xc, yc, x, y, t=T, corrlen=1.5, err=0.1)
+    >>> np.allclose(tp[:, :1], tp0), np.allclose(oa.ep, ep0)
+    (True, True)
 
-    # Add the diagonal matrix associated with the sampling error.  We use the
-    # diagonal because the error is assumed to be random.  This means it just
-    # correlates with itself at the same place.
-    A = A + err * np.eye(len(A))
+    """
+    def __init__(self, xc, yc, x, y, corrlen, err, blocksize=4096,
+                 cachesize=2 ** 28):
+        self.x, self.y = np.ravel(x), np.ravel(y)
+        self.xc, self.yc = np.ravel(xc), np.ravel(yc)
+        self.corrlen, self.err = corrlen, err
+        self.blocksize = blocksize
+        n, nv = len(self.x), len(self.xc)
 
-    # Gauss-Markov to get the weights that minimize the variance (OI).
-    tp = None
-    if t:
-        t = np.reshape(t, (n, 1))
-        tp = np.dot(C, np.linalg.solve(A, t))
-        if 0:  # NOTE: `scaloa2.m`
-            mD = (np.sum(np.linalg.solve(A, t)) /
-                  np.sum(np.sum(np.linalg.inv(A))))
-            t = t - mD
-            tp = (C * (np.linalg.solve(A, t)))
-            tp = tp + mD * np.ones(tp.shape)
-    if not t:
-        print('Computing just the interpolation errors.')
+        # Correlation matrix between stations (A).  Add the diagonal matrix
+        # associated with the sampling error.  We use the diagonal because
+        # the error is assumed to be random.  This means it just correlates
+        # with itself at the same place.  A is symmetric positive definite
+        # and is factored as A = L L^T, see `_factor`.
+        # NOTE: If the parameter zc is used (`scaloa2.m`) the correlations
+        # are (1 - d2 / zc ** 2) * np.exp(-d2 / corrlen ** 2).
+        A = _correlation(self.x, self.y, self.x, self.y, corrlen, err)
+        A.flat[::n + 1] += err
+        self.L, self._lu = _factor(A)
+
+        self._cacheable = 8 * n * nv <= cachesize
+        self._cache = None
+        self._ep = None
+
+    @property
+    def ep(self):
+        """Normalized mean error at the grid points."""
+        if self._ep is None:
+            self._sweep()
+        return self._ep
+
+    def map(self, t):
+        """
+        Maps the fields `t` observed at the stations, a 1D array or a 2D
+        (n, nfields) array, into the grid points.  Returns `tp`, with shape
+        (nv,) or (nv, nfields).
+
+        """
+        from scipy.linalg import cho_solve, lu_solve
+
+        t = np.asarray(t, dtype=float)
+        if t.shape[0] != len(self.x):
+            raise ValueError('Expected {} observations, got {}'.format(
+                len(self.x), t.shape[0]))
+
+        # Gauss-Markov weights that minimize the variance (OI), for all the
+        # fields at once.
+        fields = t.reshape(len(self.x), -1)
+        if self.L is not None:
+            weights = cho_solve((self.L, True), fields)
+        else:
+            weights = lu_solve(self._lu, fields)
+        tp = self._sweep(weights)
+        return tp.reshape((len(self.xc),) + t.shape[1:])
+
+    def _blocks(self):
+        """
+        Yields the slices of grid points and their cross correlation with
+        the stations (C), `blocksize` grid points at a time, so the memory
+        use scales with n**2 + blocksize * n instead of n * nv.
+
+        """
+        if self._cache is not None:
+            for block in self._cache:
+                yield block
+            return
+        nv, blocks = len(self.xc), []
+        for i0 in range(0, nv, self.blocksize):
+            sl = slice(i0, min(i0 + self.blocksize, nv))
+            C = _correlation(self.xc[sl], self.yc[sl], self.x, self.y,
+                             self.corrlen, self.err)
+            if self._cacheable:
+                blocks.append((sl, C))
+            yield sl, C
+        if self._cacheable:
+            self._cache = blocks
+
+    def _sweep(self, weights=None):
+        """
+        Returns `C weights` at the grid points, if `weights` are given, and
+        computes `ep` on the way if it is not known yet.
+
+        """
+        nv = len(self.xc)
+        tp = None if weights is None else np.empty((nv, weights.shape[1]))
+        ep = np.empty(nv) if self._ep is None else None
+
+        for sl, C in self._blocks():
+            if tp is not None:
+                tp[sl] = np.dot(C, weights)
+            if ep is not None:
+                # Normalized mean error.  Taking the squared root you can get
+                # the interpolation error in percentage.
+                CAC = _quadratic(self.L, self._lu, C,
+                                 overwrite=not self._cacheable)
+                ep[sl] = 1 - CAC / (1 - self.err)
+
+        if ep is not None:
+            self._ep = ep
+        return tp
+
+
+def scaloa_local(xc, yc, x, y, t=None, corrlen=None, err=None, k=32,
+                 radius=None, blocksize=4096):
+    """
+    Local scalar objective analysis.  Same as `scaloa`, with the same
+    Gaussian correlation and `err`, but each grid point is mapped using only
+    its neighbouring observations: the `k` nearest, those within `radius`
+    correlation lengths, or the `k` nearest within `radius`.  The cost grows
+    linearly with the number of grid points instead of with the cube of the
+    number of observations, which makes it usable for large data sets (e.g.
+    Argo floats or gliders).
+
+    The neighbours are found with a `scipy.spatial.cKDTree`.  Grid points
+    sharing the same neighbours are mapped together, so each distinct local
+    system is factored only once, and systems of the same size are factored
+    as a batch.
 
-    # Normalized mean error.  Taking the squared root you can get the
-    # interpolation error in percentage.
-    ep = 1 - np.sum(C.T * np.linalg.solve(A, C.T), axis=0) / (1 - err)
+    Parameters
+    ----------
+    corrlen : float
+              Correlation length.
+    err     : float
+              Random error variance (epsilon in the papers).
+    k       : int or None
+              Number of nearest observations.  None uses all the
+              observations within `radius`.
+    radius  : float, optional
+              Search radius, in units of `corrlen`.
+    blocksize : int
+                Number of grid points evaluated at a time.
+
+    Return
+    ------
+    tp : array
+         Gridded observations, with shape (nv, nfields) like `scaloa`: 1D
+         `t` gives (nv, 1) and 2D (n, nfields) arrays map several fields at
+         once.  None if `t` is None.  Grid points with no neighbours get 0,
+         the mean field.
+    ep : array
+         Normalized mean error, 1 where there are no neighbours.
+
+    Examples
+    --------
+    >>> from oceans.ocfis import scaloa, scaloa_local
+    >>> x, y = 10 * np.random.rand(2, 500)
+    >>> t = np.sin(x) * np.cos(y)
+    >>> xc, yc = [g.ravel() for g in np.mgrid[0:10:41j, 0:10:41j]]
+    >>> tp, ep = scaloa(xc, yc, x, y, t=t, corrlen=1., err=0.1)
+    >>> tpl, epl = scaloa_local(xc, yc, x, y, t=t, corrlen=1., err=0.1,
+    ...                         k=64)
+    >>> bool(np.abs(tpl - tp).max() < 0.05)
+    True
+
+    """
+    from scipy.spatial import cKDTree
 
+    x, y = np.ravel(x), np.ravel(y)
+    xc, yc = np.ravel(xc), np.ravel(yc)
+    n, nv = len(x), len(xc)
+    if k is None and radius is None:
+        raise ValueError('Either k or radius must be given.')
+
+    fields = None
+    if t is not None:
+        t = np.asarray(t, dtype=float)
+        if t.shape[0] != n:
+            raise ValueError('Expected {} observations, got {}'.format(
+                n, t.shape[0]))
+        fields = t.reshape(n, -1)
+
+    # Neighbours of each grid point, grouped by their number.
+    tree = cKDTree(np.c_[x, y])
+    points = np.c_[xc, yc]
+    if radius is None:
+        idx = tree.query(points, k=min(k, n))[1].reshape(nv, -1)
+        hoods = [(np.arange(nv), idx)]
+    else:
+        if k is None:
+            lists = tree.query_ball_point(points, radius * corrlen)
+        else:
+            idx = tree.query(points, k=min(k, n),
+                             distance_upper_bound=radius * corrlen)[1]
+            lists = [row[row < n] for row in idx.reshape(nv, -1)]
+        sizes = np.array([len(hood) for hood in lists])
+        hoods = []
+        for m in np.unique(sizes[sizes > 0]):
+            members = np.flatnonzero(sizes == m)
+            hoods.append((members, np.array([lists[i] for i in members],
+                                            dtype=int).reshape(-1, m)))
+
+    tp = np.zeros((nv, 1 if fields is None else fields.shape[1]))
+    ep = np.ones(nv)
+    for members, idx in hoods:
+        sets, inverse = np.unique(np.sort(idx, axis=1), axis=0,
+                                  return_inverse=True)
+        _local_oi(members, sets, inverse.ravel(), xc, yc, x, y, fields,
+                  corrlen, err, blocksize, tp, ep)
+
+    if fields is None:
+        return None, ep
     return tp, ep
 
+
+def _local_oi(members, sets, inverse, xc, yc, x, y, fields, corrlen, err,
+              blocksize, tp, ep):
+    """
+    Maps the grid points `members`, whose neighbours are the observations
+    `sets[inverse]`, into `tp` and `ep`.  The local correlation matrices of
+    a chunk of distinct sets are Cholesky factored as a batch, A = L L^T,
+    and the grid points use L^-1 like `ObjectiveAnalysis`.  When one of
+    them is not numerically positive definite (e.g. `err=0` with near
+    duplicate stations) the chunk uses the pseudo-inverses of A instead,
+    the least squares solutions that stay bounded where LU does not.
+
+    """
+    m = sets.shape[1]
+    eye = np.eye(m)
+
+    # Grid points sorted by their neighbourhood.
+    order = np.argsort(inverse, kind='stable')
+    bounds = np.searchsorted(inverse[order], np.arange(len(sets) + 1))
+
+    chunk = max(1, 2 ** 20 // (m * m))
+    for g0 in range(0, len(sets), chunk):
+        g1 = min(g0 + chunk, len(sets))
+        xs, ys = x[sets[g0:g1]], y[sets[g0:g1]]
+        A = _local_correlation(xs, ys, xs, ys, corrlen, err) + err * eye
+        try:
+            Linv, Ainv = np.linalg.inv(np.linalg.cholesky(A)), None
+        except np.linalg.LinAlgError:
+            Linv, Ainv = None, np.linalg.pinv(A, hermitian=True)
+        if fields is not None:
+            z = np.matmul(Ainv if Linv is None else Linv,
+                          fields[sets[g0:g1]])
+
+        todo = order[bounds[g0]:bounds[g1]]
+        for p0 in range(0, len(todo), blocksize):
+            sel = todo[p0:p0 + blocksize]
+            g = inverse[sel] - g0
+            p = members[sel]
+            C = _local_correlation(xc[p, None], yc[p, None], xs[g], ys[g],
+                                   corrlen, err)[:, 0]
+            if Linv is not None:
+                # C A^-1 t = (L^-1 C)^T L^-1 t and C A^-1 C^T = |L^-1 C|^2.
+                v = u = np.einsum('pij,pj->pi', Linv[g], C)
+            else:
+                v, u = C, np.einsum('pij,pj->pi', Ainv[g], C)
+            if fields is not None:
+                tp[p] = np.einsum('pi,pif->pf', v, z[g])
+            ep[p] = 1 - np.einsum('pi,pi->p', v, u) / (1 - err)
+
+
+def _local_correlation(x0, y0, x1, y1, corrlen, err):
+    """
+    Gaussian correlation between the stacked point sets (..., m0) and
+    (..., m1), with shape (..., m0, m1).
+
+    """
+    d2 = ((x0[..., :, None] - x1[..., None, :]) ** 2 +
+          (y0[..., :, None] - y1[..., None, :]) ** 2)
+    return (1 - err) * np.exp(-d2 / corrlen ** 2)
+
+
+def scaloa_tiled(xc, yc, x, y, t=None, corrlen=None, err=None, tile=16384,
+                 processes=None, k=None, radius=None, blocksize=4096):
+    """
+    Parallel `scaloa`.  The grid points are split into tiles of `tile`
+    points that are mapped in a process pool and reassembled into `tp` and
+    `ep`.
+
+    The correlation matrix is factored once, A = L L^T, in the calling
+    process.  The factor, the positions, the data and the outputs are put
+    in shared memory (`multiprocessing.shared_memory`), so the workers
+    only receive the bounds of their tile and write their results in
+    place.  Each worker then costs O(n**2) per grid point, like `scaloa`.
+
+    With `k` or `radius` the tiles are mapped with `scaloa_local` instead,
+    and each tile only uses the observations within `radius` correlation
+    lengths of its bounding box.
+
+    Parameters
+    ----------
+    corrlen : float
+              Correlation length.
+    err     : float
+              Random error variance (epsilon in the papers).
+    tile    : int
+              Number of grid points per task.
+    processes : int, optional
+                Size of the process pool.  Default is the number of CPUs,
+                and 1 maps the tiles in the current process.  Limit the
+                BLAS threads of the workers (e.g. OMP_NUM_THREADS=1) to
+                avoid oversubscribing the CPUs.  See `smoo2_tiled` about
+                the start method of the pool.
+    k, radius : int, float, optional
+                Local analysis neighbourhoods, see `scaloa_local`.
+    blocksize : int
+                Number of grid points evaluated at a time by each worker.
+
+    Return
+    ------
+    tp : array
+         Gridded observations, (nv, 1) like `scaloa` for 1D `t` or
+         (nv, nfields) for 2D (n, nfields) `t`.  None if `t` is None.
+    ep : array
+         Normalized mean error.
+
+    Examples
+    --------
+    >>> from oceans.ocfis import scaloa, scaloa_tiled
+    >>> x, y = 10 * np.random.rand(2, 200)
+    >>> t = np.sin(x) * np.cos(y)
+    >>> xc, yc = [g.ravel() for g in np.mgrid[0:10:41j, 0:10:41j]]
+    >>> tp, ep = scaloa_tiled(xc, yc, x, y, t=t, corrlen=1., err=0.1,
+    ...                       tile=500, processes=2)
+    >>> tp0, ep0 = scaloa(xc, yc, x, y, t=t, corrlen=1., err=0.1)
+    >>> np.allclose(tp, tp0), np.allclose(ep, ep0)
+    (True, True)
+
+    """
+    from multiprocessing import cpu_count
+    from scipy.linalg import lu_solve, solve_triangular
+
+    from ..utilities import _pool_context
+
+    x, y = np.ravel(x), np.ravel(y)
+    xc, yc = np.ravel(xc), np.ravel(yc)
+    n, nv = len(x), len(xc)
+    local = k is not None or radius is not None
+
+    arrays = dict(x=x, y=y, xc=xc, yc=yc, ep=np.empty(nv))
+    if t is not None:
+        fields = np.asarray(t, dtype=float).reshape(n, -1)
+        arrays['tp'] = np.empty((nv, fields.shape[1]))
+    if local:
+        if t is not None:
+            arrays['t'] = fields
+    else:
+        # See `ObjectiveAnalysis`.  The workers use tp = (L^-1 C^T)^T z
+        # with z = L^-1 t, or tp = C A^-1 t with the LU factors of A.
+        A = _correlation(x, y, x, y, corrlen, err)
+        A.flat[::n + 1] += err
+        L, lu = _factor(A)
+        del A
+        if L is not None:
+            arrays['L'] = L
+            if t is not None:
+                arrays['z'] = solve_triangular(L, fields, lower=True)
+        else:
+            # The shared arrays are floats, the pivots are cast back.
+            arrays['lu'], arrays['piv'] = lu[0], lu[1].astype(float)
+            if t is not None:
+                arrays['z'] = lu_solve(lu, fields)
+
+    params = dict(corrlen=corrlen, err=err, k=k, radius=radius,
+                  blocksize=blocksize)
+    tasks = [(i0, min(i0 + tile, nv), params) for i0 in range(0, nv, tile)]
+
+    if processes is None:
+        processes = cpu_count()
+
+    if processes == 1:
+        _oa_shared.update(arrays)
+        try:
+            for task in tasks:
+                _scaloa_tile(task)
+        finally:
+            _oa_shared.clear()
+        ep, tp = arrays['ep'], arrays.get('tp')
+    else:
+        segments = _share(arrays)
+        try:
+            specs = dict((name, (shm.name, arr.shape))
+                         for name, (shm, arr) in segments.items())
+            pool = _pool_context().Pool(processes, initializer=_attach,
+                                        initargs=(specs,))
+            try:
+                for _ in pool.imap_unordered(_scaloa_tile, tasks):
+                    pass
+            finally:
+                pool.terminate()
+            ep = segments['ep'][1].copy()
+            tp = segments['tp'][1].copy() if t is not None else None
+        finally:
+            for shm, _ in segments.values():
+                shm.close()
+                shm.unlink()
+
+    return tp, ep
+
+
+# Arrays of `scaloa_tiled`, shared with the worker processes.
+_oa_shared = {}
+
+
+def _share(arrays):
+    """Copies the float `arrays` into new shared memory segments."""
+    from multiprocessing.shared_memory import SharedMemory
+
+    segments = {}
+    try:
+        for name, arr in arrays.items():
+            shm = SharedMemory(create=True, size=max(arr.nbytes, 1))
+            segments[name] = (shm, np.ndarray(arr.shape, float,
+                                              buffer=shm.buf))
+            segments[name][1][...] = arr
+    except Exception:
+        for shm, _ in segments.values():
+            shm.close()
+            shm.unlink()
+        raise
+    return segments
+
+
+def _attach(specs):
+    """Pool initializer, maps the shared arrays of `scaloa_tiled`."""
+    from multiprocessing.shared_memory import SharedMemory
+
+    for name, (shm_name, shape) in specs.items():
+        shm = SharedMemory(name=shm_name)
+        # Keeping a reference to the segment keeps the buffer alive.
+        _oa_shared[name + '_shm'] = shm
+        _oa_shared[name] = np.ndarray(shape, float, buffer=shm.buf)
+
+
+def _scaloa_tile(task):
+    """Maps the grid points i0:i1 of `scaloa_tiled` (pool worker)."""
+    from scipy.linalg import solve_triangular
+
+    i0, i1, params = task
+    arrays = _oa_shared
+    x, y, xc, yc = arrays['x'], arrays['y'], arrays['xc'], arrays['yc']
+    tp, ep = arrays.get('tp'), arrays['ep']
+    corrlen, err = params['corrlen'], params['err']
+
+    if 'L' not in arrays and 'lu' not in arrays:  # Local analysis.
+        keep = np.ones(len(x), bool)
+        if params['radius'] is not None:
+            r = params['radius'] * corrlen
+            keep = ((x >= xc[i0:i1].min() - r) & (x <= xc[i0:i1].max() + r) &
+                    (y >= yc[i0:i1].min() - r) & (y <= yc[i0:i1].max() + r))
+        t = arrays.get('t')
+        if not keep.any():
+            if tp is not None:
+                tp[i0:i1] = 0
+            ep[i0:i1] = 1
+            return
+        tpl, ep[i0:i1] = scaloa_local(
+            xc[i0:i1], yc[i0:i1], x[keep], y[keep],
+            t=None if t is None else t[keep], corrlen=corrlen, err=err,
+            k=params['k'], radius=params['radius'],
+            blocksize=params['blocksize'])
+        if tp is not None:
+            tp[i0:i1] = tpl
+        return
+
+    L, z = arrays.get('L'), arrays.get('z')
+    lu = None
+    if L is None:
+        lu = arrays['lu'], arrays['piv'].astype(np.int32)
+    for b0 in range(i0, i1, params['blocksize']):
+        sl = slice(b0, min(b0 + params['blocksize'], i1))
+        C = _correlation(xc[sl], yc[sl], x, y, corrlen, err)
+        if L is not None:
+            v = solve_triangular(L, C.T, lower=True, overwrite_b=True)
+            if tp is not None:
+                tp[sl] = np.dot(v.T, z)
+            ep[sl] = 1 - np.einsum('ij,ij->j', v, v) / (1 - err)
+        else:
+            if tp is not None:
+                tp[sl] = np.dot(C, z)
+            ep[sl] = 1 - _quadratic(None, lu, C) / (1 - err)
+
+
+def _factor(A):
+    """
+    Cholesky factor `L` of the correlation matrix `A`, as `(L, None)`.  With
+    `err=0` and near duplicate stations `A` is singular to machine precision
+    and the Cholesky factorization can fail, then the LU factors of `A` are
+    returned instead, as `(None, (lu, piv))`, like `np.linalg.solve` does.
+
+    """
+    from scipy.linalg import LinAlgError, cholesky, lu_factor
+
+    try:
+        return cholesky(A, lower=True), None
+    except LinAlgError:
+        return None, lu_factor(A, overwrite_a=True)
+
+
+def _quadratic(L, lu, C, overwrite=False):
+    """
+    Diagonal of C A^-1 C^T, given the factors of A from `_factor`.  With the
+    Cholesky factor it is the squared norm of the columns of L^-1 C^T, a
+    single triangular solve.
+
+    """
+    from scipy.linalg import lu_solve, solve_triangular
+
+    if L is not None:
+        v = solve_triangular(L, C.T, lower=True, overwrite_b=overwrite)
+        return np.einsum('ij,ij->j', v, v)
+    return np.einsum('ij,ji->j', lu_solve(lu, C.T), C)
+
+
+def _correlation(x0, y0, x1, y1, corrlen, err):
+    """
+    Gaussian correlation `(1 - err) * exp(-d**2 / corrlen**2)` between the
+    points (x0, y0) (rows) and (x1, y1) (columns), computed in place on a
+    single (len(x0), len(x1)) array.
+
+    """
+    # Squared distance matrix, by broadcasting.
+    C = np.subtract.outer(x0, x1)
+    C *= C
+    dy = np.subtract.outer(y0, y1)
+    dy *= dy
+    C += dy
+    del dy
+
+    C *= -1. / corrlen ** 2
+    np.exp(C, out=C)
+    C *= 1 - err
+    return C
+
 if __name__ == '__main__':
     import doctest
     doctest.testmod()
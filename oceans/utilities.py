@@ -10,6 +10,21 @@ def basename(fname):
     return os.path.splitext(os.path.basename(fname))
 
 
+def _pool_context():
+    """
+    Multiprocessing context of the process pools.  Forking once numba's TBB
+    or OpenMP threading layer is running can hang the workers, so fresh
+    workers are spawned in that case.
+
+    """
+    import sys
+    from multiprocessing import get_context
+
+    launched = any(name in sys.modules for name in ['numba.np.ufunc.tbbpool',
+                                                    'numba.np.ufunc.omppool'])
+    return get_context('spawn' if launched else None)
+
+
 class match_args_return(object):
     """
     Function decorator to homogenize input arguments and to make the output
@@ -47,7 +47,7 @@ long_description = '{}\n{}'.format(read('README.rst'), read('CHANGES.txt'))
 
 # Dependencies.
 hard = ['gsw', 'matplotlib', 'numpy', 'seawater']
-soft = dict(full=['cartopy' 'iris', 'netcdf4', 'pandas', 'scipy'])
+soft = dict(full=['cartopy' 'iris', 'netcdf4', 'numba', 'pandas', 'scipy'])
 packages = ['oceans', 'oceans/RPSstuff', 'oceans/colormaps', 'oceans/datasets',
             'oceans/ocfis', 'oceans/plotting', 'oceans/sw_extras']
 
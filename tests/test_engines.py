@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+
+"""
+Test filter engines
+===================
+
+"""
+
+from __future__ import (absolute_import, division, print_function)
+
+import sys
+import warnings
+
+import numpy as np
+import pytest
+
+from oceans.filters import (get_engine, md_trenberth, medfilt1, medfilt2,
+                            set_engine, smoo2, weim)
+
+
+def _numba_available():
+    try:
+        import numba  # noqa
+    except ImportError:
+        return False
+    return True
+
+
+engines = ['numpy',
+           pytest.param('numba', marks=pytest.mark.skipif(
+               not _numba_available(), reason='numba is not installed'))]
+
+
+def _data(shape=(40, 300), seed=0):
+    x = np.random.RandomState(seed).randn(*shape)
+    x[3, 10:14] = np.NaN
+    x[7, 100] = -9999
+    return x
+
+
+def _loop_weim(x, w, badflag=-9999):
+    """Reference `weim` along the last axis, one point at a time."""
+    xs = np.full(x.shape, np.NaN)
+    h = len(w) // 2
+    for idx in np.ndindex(*x.shape):
+        i, j = idx[:-1], idx[-1]
+        lo, hi = max(j - h, 0), min(j + h + 1, x.shape[-1])
+        seg, ws = x[i][lo:hi], w[lo - j + h:hi - j + h]
+        ok = ~(np.isnan(seg) | (seg == badflag))
+        if ws[ok].sum() > 0:
+            xs[idx] = (ws[ok] * seg[ok]).sum() / ws[ok].sum()
+    xs[np.isnan(x)] = np.NaN
+    return xs
+
+
+@pytest.mark.parametrize('engine', engines)
+@pytest.mark.parametrize('dtype', [np.float64, np.float32])
+def test_smoo2_engines(engine, dtype):
+    x = _data().astype(dtype)
+    expected = smoo2(x, 7, 11, method='fft')
+    As = smoo2(x, 7, 11, engine=engine)
+    assert As.dtype == dtype
+    np.testing.assert_allclose(As, expected, rtol=1e-4, atol=1e-5)
+    np.testing.assert_array_equal(np.isnan(As), np.isnan(x))
+
+
+@pytest.mark.parametrize('engine', engines)
+@pytest.mark.parametrize('axis', [None, 0, 1])
+def test_weim_engines(engine, axis):
+    x = _data()
+    w = np.hanning(9)
+    if axis is None:
+        expected = _loop_weim(x.ravel(), w)
+    else:
+        expected = np.moveaxis(_loop_weim(np.moveaxis(x, axis, -1), w), -1,
+                               axis)
+    np.testing.assert_allclose(weim(x, 9, axis=axis, engine=engine),
+                               expected, atol=1e-12)
+
+
+@pytest.mark.parametrize('engine', engines)
+@pytest.mark.parametrize('L', [2, 7, 31])
+def test_medfilt1_engines(engine, L):
+    x = np.round(_data() * 4)  # Many ties.
+    Lwing = (L | 1) // 2
+    expected = np.empty(x.shape)
+    for i, j in np.ndindex(*x.shape):
+        expected[i, j] = np.median(x[i, max(j - Lwing, 0):j + Lwing + 1])
+    np.testing.assert_array_equal(medfilt1(x, L, engine=engine), expected)
+    np.testing.assert_array_equal(medfilt1(x.T, L, axis=0, engine=engine),
+                                  expected.T)
+    assert medfilt1(x.astype(np.float32), L,
+                    engine=engine).dtype == np.float32
+
+
+@pytest.mark.parametrize('engine', engines)
+@pytest.mark.parametrize('L', [3, (5, 9), (1, 21)])
+def test_medfilt2_engines(engine, L):
+    rs = np.random.RandomState(1)
+    A = np.round(rs.randn(30, 45) * 4)  # Many ties.
+    A[rs.rand(*A.shape) > 0.8] = np.NaN
+    A[:6, :6] = np.NaN  # Windows with no valid data.
+    hei, wid = (L, L) if np.isscalar(L) else L
+    lh, lw = hei // 2, wid // 2
+    expected = np.full(A.shape, np.NaN)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        for i, j in np.ndindex(*A.shape):
+            expected[i, j] = np.nanmedian(A[max(i - lh, 0):i + lh + 1,
+                                            max(j - lw, 0):j + lw + 1])
+    expected[np.isnan(A)] = np.NaN
+    np.testing.assert_array_equal(medfilt2(A, L, engine=engine), expected)
+    out = np.empty(A.shape, np.float32)
+    assert medfilt2(A, L, out=out, engine=engine) is out
+    np.testing.assert_allclose(out, expected)
+
+
+@pytest.mark.parametrize('engine', engines)
+@pytest.mark.parametrize('mode', ['valid', 'same'])
+def test_md_trenberth_engines(engine, mode):
+    from oceans.filters.filters import _trenberth
+
+    x = _data()
+    expected = np.array([np.convolve(xi, _trenberth, mode='valid')
+                         for xi in x])
+    if mode == 'same':
+        pad = np.full((x.shape[0], 5), np.NaN)
+        expected = np.hstack((pad, expected, pad))
+    y = md_trenberth(x.T, axis=0, mode=mode, engine=engine)
+    np.testing.assert_allclose(y.T, expected, atol=1e-12)
+
+
+def test_set_engine():
+    assert get_engine() == 'numpy'
+    try:
+        set_engine('numba')
+        x = _data()
+        np.testing.assert_allclose(medfilt1(x, 5),
+                                   medfilt1(x, 5, engine='numpy'))
+    finally:
+        set_engine('numpy')
+    with pytest.raises(ValueError):
+        set_engine('cython')
+    with pytest.raises(ValueError):
+        medfilt1(_data(), 5, engine='cython')
+
+
+def test_numba_fallback(monkeypatch):
+    # A None entry in `sys.modules` makes the import fail.
+    monkeypatch.setitem(sys.modules, 'numba', None)
+    monkeypatch.delitem(sys.modules, 'oceans.filters._jit', raising=False)
+    monkeypatch.delattr('oceans.filters._jit', raising=False)
+    x = _data()
+    with pytest.warns(RuntimeWarning):
+        y = md_trenberth(x, engine='numba')
+    np.testing.assert_array_equal(y, md_trenberth(x, engine='numpy'))
@@ -0,0 +1,445 @@
+# -*- coding: utf-8 -*-
+
+"""
+Test filters
+============
+
+"""
+
+from __future__ import (absolute_import, division, print_function)
+
+import warnings
+
+import numpy as np
+import pytest
+
+from oceans.filters import (boxcar, convolve, fft_filterbank, fft_lowpass,
+                            frequency_response, gapfilter, godin,
+                            kernel_cache_clear, kernel_cache_info, lanc,
+                            lanc_decimate, md_trenberth, medfilt1, medfilt2,
+                            pl33tn, smoo1, smoo2, smoo2_tiled, weim)
+
+
+def _smoo2_loop(A, wdw, badflag=-9999):
+    """Per-pixel reference for the edge-truncated, NaN-aware window mean."""
+    hei, wid = wdw.shape
+    lh, lw = hei // 2, wid // 2
+    imax, jmax = A.shape
+    As = np.zeros((imax, jmax))
+    for i in range(imax):
+        for j in range(jmax):
+            upp, low = max(i - lh, 0), min(i + lh + 1, imax)
+            lef, rig = max(j - lw, 0), min(j + lw + 1, jmax)
+            Ac = A[upp:low, lef:rig]
+            wdwc = wdw[upp - i + lh:low - i + lh, lef - j + lw:rig - j + lw]
+            f = ~np.isnan(Ac) & (Ac != badflag)
+            As[i, j] = (Ac[f] * wdwc[f]).sum() / wdwc[f].sum()
+    As[np.isnan(A)] = np.NaN
+    return As
+
+
+@pytest.mark.parametrize('method', ['separable', 'fft'])
+def test_smoo2_matches_loop(method):
+    rs = np.random.RandomState(0)
+    A = rs.randn(23, 31)
+    A[3, 4] = np.NaN
+    A[10:12, 20:25] = np.NaN
+    A[15, 7] = -9999
+    wdw = np.outer(np.hamming(5), np.hamming(7))
+    As = smoo2(A, 5, 7, kind='hamming', method=method)
+    np.testing.assert_allclose(As, _smoo2_loop(A, wdw), rtol=1e-10)
+
+
+def test_smoo2_does_not_modify_input():
+    A = np.arange(30.).reshape(5, 6)
+    A[2, 2] = np.NaN
+    A0 = A.copy()
+    smoo2(A, 3, 3)
+    np.testing.assert_array_equal(A, A0)
+
+
+def test_smoo2_hann_all_bad_window_is_nan():
+    # The hann end-points are zero, so a lone valid corner gets no weight.
+    A = np.full((5, 5), -9999.)
+    A[0, 0] = 1.
+    As = smoo2(A, 3, 3, kind='hann')
+    assert As[0, 0] == 1.
+    assert np.isnan(As[1:, 1:]).all()
+
+
+@pytest.mark.parametrize('processes', [1, 2])
+def test_smoo2_tiled_matches_in_memory(tmpdir, processes):
+    rs = np.random.RandomState(1)
+    A = rs.randn(101, 77)
+    A[A > 1.5] = np.NaN
+    fname = str(tmpdir.join('A.dat'))
+    Am = np.memmap(fname, dtype=float, mode='w+', shape=A.shape)
+    Am[:] = A
+    out = str(tmpdir.join('As.dat'))
+    As = smoo2_tiled(Am, 7, 9, out=out, tile=(30, 20), processes=processes,
+                     kind='kaiser')
+    assert isinstance(As, np.memmap)
+    np.testing.assert_array_equal(As, smoo2(A, 7, 9, kind='kaiser'))
+
+
+def _weim_loop(x, w, badflag=-9999):
+    """Per-sample reference for the edge-truncated, NaN-aware window mean."""
+    ln = len(w) // 2
+    Fnan = np.isnan(x)
+    x = np.where(x == badflag, np.NaN, x)
+    xs = np.zeros_like(x)
+    for i in range(x.size):
+        lo, hi = max(i - ln, 0), min(i + ln + 1, x.size)
+        xx, ww = x[lo:hi], w[lo - i + ln:hi - i + ln]
+        f = ~np.isnan(xx)
+        xs[i] = (xx[f] * ww[f]).sum() / ww[f].sum() if f.any() else np.NaN
+    xs[Fnan] = np.NaN
+    return xs
+
+
+def test_weim_matches_loop():
+    rs = np.random.RandomState(2)
+    x = rs.randn(200)
+    x[[5, 50, 51, 52, 199]] = np.NaN
+    x[100] = -9999
+    w = np.kaiser(11, 14)
+    np.testing.assert_allclose(weim(x, 11, kind='kaiser'), _weim_loop(x, w),
+                               rtol=1e-10)
+
+
+def test_weim_axis():
+    rs = np.random.RandomState(3)
+    x = rs.randn(4, 150)
+    x[x > 1.8] = np.NaN
+    xs = weim(x, 9, axis=1)
+    assert xs.shape == x.shape
+    for row, rows in zip(x, xs):
+        np.testing.assert_allclose(rows, weim(row, 9), rtol=1e-12)
+    np.testing.assert_allclose(weim(x.T, 9, axis=0), xs.T, rtol=1e-12)
+
+
+def _medfilt1_loop(x, L):
+    """Per-sample reference with shrinking windows at the edges."""
+    Lwing = L // 2
+    return np.array([np.median(x[max(i - Lwing, 0):i + Lwing + 1])
+                     for i in range(len(x))])
+
+
+@pytest.mark.parametrize('L', [2, 3, 8, 25])
+def test_medfilt1_matches_loop(L):
+    rs = np.random.RandomState(4)
+    x = np.round(rs.randn(120), 1)  # Ties exercise the sorted deletions.
+    x[[0, 60, 61]] = np.NaN
+    with np.errstate(invalid='ignore'):
+        np.testing.assert_array_equal(medfilt1(x, L),
+                                      _medfilt1_loop(x, L | 1))
+
+
+def test_medfilt1_axis():
+    rs = np.random.RandomState(5)
+    x = rs.randn(30, 3)
+    xout = medfilt1(x, 7, axis=0)
+    for k in range(3):
+        np.testing.assert_array_equal(xout[:, k], medfilt1(x[:, k], 7))
+
+
+def test_md_trenberth_nd():
+    weight = np.array([0.02700, 0.05856, 0.09030, 0.11742, 0.13567, 0.14210,
+                       0.13567, 0.11742, 0.09030, 0.05856, 0.02700])
+    rs = np.random.RandomState(6)
+    x = rs.randn(40, 3, 2)
+    y = md_trenberth(x, axis=0)
+    assert y.shape == (30, 3, 2)
+    np.testing.assert_allclose(
+        y[:, 1, 0], np.convolve(x[:, 1, 0], weight, mode='valid'))
+
+    ys = md_trenberth(x, axis=0, mode='same')
+    assert ys.shape == x.shape
+    assert np.isnan(ys[:5]).all() and np.isnan(ys[-5:]).all()
+    np.testing.assert_array_equal(ys[5:-5], y)
+
+
+@pytest.mark.parametrize('mode', ['valid', 'same', 'full'])
+@pytest.mark.parametrize('method', ['direct', 'fft'])
+def test_convolve_matches_np_convolve(mode, method):
+    rs = np.random.RandomState(7)
+    x = rs.randn(2, 3000)
+    x[1, 1000] = np.NaN
+    wt = lanc(40, 1. / 40)
+    y = convolve(x.T, wt, axis=0, mode=mode, method=method)
+    for k in range(2):
+        np.testing.assert_allclose(y[:, k], np.convolve(x[k], wt, mode=mode),
+                                   atol=1e-12)
+
+
+@pytest.mark.parametrize('mode', ['valid', 'same', 'full'])
+@pytest.mark.parametrize('N', [5, 8])
+def test_convolve_kernel_longer_than_series(mode, N):
+    x = np.random.RandomState(7).randn(2, N)
+    for wt in [np.hanning(9), np.hanning(12)]:
+        y = convolve(x, wt, mode=mode, method='fft')
+        expected = [np.convolve(xi, wt, mode=mode) for xi in x]
+        np.testing.assert_allclose(y, expected, atol=1e-12)
+
+
+def test_pl33tn_axis_and_long_kernel():
+    rs = np.random.RandomState(8)
+    x = rs.randn(3, 6000)
+    xf = pl33tn(x, dt=1. / 60, axis=1)  # About 4000 taps, overlap-add.
+    np.testing.assert_allclose(xf[2], pl33tn(x[2], dt=1. / 60,
+                                             method='direct'), atol=1e-12)
+
+
+def test_kernel_cache():
+    from oceans.filters.filters import _lanc
+
+    kernel_cache_clear()
+    x = np.random.RandomState(9).randn(500)
+    pl33tn(x, dt=2.)
+    pl33tn(x, dt=2.)
+    weim(x, 11)
+    smoo1(x, 11, 'flat')
+    info = kernel_cache_info()
+    assert (info.hits, info.misses, info.currsize) == (1, 3, 3)
+    wt = lanc(10, 0.1)
+    expected = wt.copy()
+    wt *= 2  # A copy, the cached kernel is left untouched.
+    np.testing.assert_array_equal(lanc(10, 0.1), expected)
+    info = kernel_cache_info()
+    assert (info.hits, info.misses) == (2, 4)
+    assert not _lanc(10, 0.1).flags.writeable
+    kernel_cache_clear()
+    assert kernel_cache_info().currsize == 0
+
+
+@pytest.mark.parametrize('n', [501, 1000])
+def test_fft_filterbank_matches_fft_lowpass(n):
+    rs = np.random.RandomState(13)
+    x = rs.randn(3, n)
+    cutoffs = [(1. / 30, 1. / 40), (1. / 10, 1. / 12)]
+    low, mid, high = fft_filterbank(x, cutoffs, axis=1, pad=False)
+    np.testing.assert_allclose(low[1], fft_lowpass(x[1], *cutoffs[0]),
+                               atol=1e-12)
+    np.testing.assert_allclose(low[1] + mid[1],
+                               fft_lowpass(x[1], *cutoffs[1]), atol=1e-12)
+    bands = fft_filterbank(x.T, cutoffs, axis=0)
+    np.testing.assert_allclose(sum(bands), x.T, atol=1e-12)
+
+
+def test_gapfilter_matches_segments():
+    rs = np.random.RandomState(14)
+    x = rs.randn(2, 600)
+    x[0, [100, 300, 301, 302]] = np.NaN
+    wt = lanc(20, 1. / 40)
+    y = gapfilter(x.T, wt, maxgap=1, axis=0)[:, 0]
+    assert np.isnan(y[:20]).all() and np.isnan(y[-20:]).all()
+    assert not np.isnan(y[100])  # Filled, one point gap.
+    assert np.isnan(y[300 - 20:303 + 20]).all()
+
+    seg = x[0, 303:]
+    np.testing.assert_allclose(y[323:-20], np.convolve(seg, wt, 'valid'),
+                               atol=1e-12)
+
+    xf = x[0, :300].copy()
+    xf[100] = 0.5 * (xf[99] + xf[101])
+    np.testing.assert_allclose(y[20:280], np.convolve(xf, wt, 'valid'),
+                               atol=1e-12)
+
+
+def test_pl33tn_maxgap():
+    x = np.random.RandomState(15).randn(500)
+    x[200:210] = np.NaN
+    xf = pl33tn(x, dt=2., maxgap=0)
+    assert xf.shape == x.shape
+    np.testing.assert_allclose(xf[16:184], pl33tn(x[:200], dt=2.))
+
+
+def test_smoo1_maxgap_matches_segments():
+    x = np.sin(np.linspace(0, 20, 300))
+    x[[50, 150, 151, 152, 153, 155]] = np.NaN
+    xs = smoo1(x, 11, maxgap=1)
+    assert np.isnan(xs[150:154]).all()
+
+    filled = x.copy()
+    filled[[50, 155]] = 0.5 * (x[[49, 154]] + x[[51, 156]])
+    np.testing.assert_allclose(xs[:150], smoo1(filled[:150], 11))
+    np.testing.assert_allclose(xs[154:], smoo1(filled[154:], 11))
+
+    # Without interpolation the lone NaN splits the first segment.
+    xs = smoo1(x, 11, maxgap=0)
+    assert np.isnan(xs[50])
+    np.testing.assert_allclose(xs[51:150], smoo1(x[51:150], 11))
+
+
+def test_boxcar_and_godin_match_convolution():
+    rs = np.random.RandomState(16)
+    x = 1000. + rs.randn(2, 24 * 20)
+    x[1, 200] = np.NaN
+    np.testing.assert_allclose(boxcar(x, 24, axis=1)[0],
+                               np.convolve(x[0], np.ones(24) / 24, 'valid'))
+    kernel = np.convolve(np.convolve(np.ones(24), np.ones(24)), np.ones(25))
+    kernel /= kernel.sum()
+    for k in range(2):
+        y = godin(x.T, axis=0, mode='same')[:, k]
+        np.testing.assert_allclose(y[35:-35],
+                                   np.convolve(x[k], kernel, 'same')[35:-35])
+        assert np.isnan(y[:35]).all() and np.isnan(y[-35:]).all()
+    assert np.isnan(godin(x[1])[200 - 70:201]).all()
+
+
+def test_godin_minute_data():
+    t = np.arange(0, 24 * 10, 1. / 60)  # Time in hours.
+    x = 2.5 * np.sin(2 * np.pi * t / 12.42)
+    y = godin(x, dt=1. / 60)
+    assert len(y) == len(t) - (3 * 1440 + 60 - 3)
+    assert np.abs(y).max() < 0.01
+
+
+def test_lanc_decimate():
+    rs = np.random.RandomState(17)
+    x = rs.randn(1000, 2)
+    y, idx = lanc_decimate(x, 30, 1. / 60, 24, axis=0)
+    wt = lanc(30, 1. / 60)
+    assert idx[0] == 48 and idx[-1] == 960
+    assert y.shape == (len(idx), 2)
+    for k, i in enumerate(idx):
+        np.testing.assert_allclose(y[k], wt.dot(x[i - 30:i + 31]))
+    y, idx = lanc_decimate(x[:40, 0], 30, 1. / 60, 24)
+    assert y.shape == idx.shape == (0,)
+    # More phases than weights.
+    y, idx = lanc_decimate(x[:, 1], 5, 1. / 10, 24)
+    full = np.convolve(x[:, 1], lanc(5, 1. / 10), mode='same')
+    np.testing.assert_allclose(y, full[idx])
+
+
+@pytest.mark.parametrize('L', [3, (4, 7)])
+def test_medfilt2_matches_loop(L):
+    rs = np.random.RandomState(19)
+    A = rs.randn(17, 23)
+    A[rs.rand(*A.shape) > 0.8] = np.NaN
+    A[:4, :4] = np.NaN  # A window with no valid data.
+    hei, wid = (L, L) if np.isscalar(L) else L
+    lh, lw = hei // 2, wid // 2
+    expected = np.full(A.shape, np.NaN)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        for i in range(A.shape[0]):
+            for j in range(A.shape[1]):
+                expected[i, j] = np.nanmedian(A[max(i - lh, 0):i + lh + 1,
+                                                max(j - lw, 0):j + lw + 1])
+    expected[np.isnan(A)] = np.NaN
+    np.testing.assert_array_equal(medfilt2(A, L), expected)
+
+
+def test_smoo1_axis_array_window_and_fft():
+    rs = np.random.RandomState(21)
+    x = rs.randn(4, 400)
+
+    # Legacy 1D algorithm.
+    wl, w = 11, np.hanning(11)
+    s = np.r_[2 * x[1, 0] - x[1, wl:1:-1], x[1], 2 * x[1, -1] -
+              x[1, -1:-wl:-1]]
+    expected = np.convolve(w / w.sum(), s, mode='same')[wl - 1:-wl + 1]
+    np.testing.assert_allclose(smoo1(x[1]), expected)
+
+    xs = smoo1(x.T, axis=0)
+    assert xs.shape == (400, 4)
+    np.testing.assert_allclose(xs[:, 1], expected)
+    np.testing.assert_allclose(smoo1(x, window=np.hanning(11))[1], expected)
+
+    kaiser = np.kaiser(301, 8)
+    np.testing.assert_allclose(smoo1(x, window=kaiser, method='fft'),
+                               smoo1(x, window=kaiser, method='direct'),
+                               atol=1e-12)
+
+
+def test_frequency_response():
+    wt = lanc(30, 1. / 40)
+    freq, amp, phase = frequency_response(wt, nfft=512)
+    k = np.arange(len(wt)) - 30
+    H = np.array([(wt * np.exp(-2j * np.pi * f * k)).sum() for f in freq])
+    np.testing.assert_allclose(amp, np.abs(H), atol=1e-12)
+    np.testing.assert_allclose(np.cos(phase), np.sign(H.real), atol=1e-9)
+
+    cached = frequency_response('lanc', nfft=512, numwt=30, haf=1. / 40)[1]
+    assert np.shares_memory(cached, amp)
+    freq, amp, _ = frequency_response('boxcar', n=24, nfft=240)
+    assert amp[0] == 1 and amp[10] < 1e-12  # Zero at 1 / 24 cph.
+    freq, amp, _ = frequency_response('godin', dt=0.5)
+    assert freq[-1] == 1.
+    freq, amp, _ = frequency_response('md_trenberth')
+    np.testing.assert_allclose(amp[0], 1.)
+    with pytest.raises(ValueError):
+        frequency_response('pl33tn', dt=1. / 60, nfft=1024)
+
+
+_float32_cases = [
+    (smoo1, {}),
+    (smoo1, {'maxgap': 2}),
+    (gapfilter, {'weights': lanc(12, 1. / 40), 'maxgap': 1}),
+    (smoo2, {'hei': 5, 'wid': 5}),
+    (smoo2, {'hei': 5, 'wid': 5, 'method': 'fft'}),
+    (weim, {'N': 11, 'axis': 1}),
+    (medfilt1, {'L': 5}),
+    (medfilt2, {'L': 3}),
+    (md_trenberth, {'mode': 'same'}),
+    (convolve, {'weights': lanc(12, 1. / 40), 'mode': 'same'}),
+    (convolve, {'weights': lanc(12, 1. / 40), 'method': 'fft'}),
+    (pl33tn, {}),
+    (boxcar, {'n': 5, 'mode': 'same'}),
+    (godin, {'dt': 0.25}),
+]
+
+
+@pytest.mark.parametrize('func, kw', _float32_cases)
+def test_float32_and_out(func, kw):
+    x = np.random.randn(3, 400)
+    x[1, 50] = np.NaN
+    expected = func(x, **kw)
+
+    y = func(x.astype(np.float32), **kw)
+    assert y.dtype == np.float32
+    np.testing.assert_allclose(y, expected, rtol=1e-4, atol=1e-4)
+
+    out = np.empty(expected.shape, np.float32)
+    assert func(x, out=out, **kw) is out
+    np.testing.assert_allclose(out, expected, rtol=1e-4, atol=1e-4)
+    assert func(x, dtype=np.float32, **kw).dtype == np.float32
+    assert func(np.arange(1200).reshape(3, 400) % 7,
+                **kw).dtype == np.float64
+
+
+def test_smoo2_float32_sparse_methods_agree():
+    rs = np.random.RandomState(0)
+    A = rs.randn(60, 60).astype(np.float32)
+    A[rs.rand(60, 60) > 0.03] = -9999  # Only 3% valid data.
+    fft = smoo2(A, 21, 21, kind='kaiser', method='fft')
+    sep = smoo2(A, 21, 21, kind='kaiser', method='separable')
+    assert fft.dtype == np.float32
+    np.testing.assert_array_equal(np.isnan(fft), np.isnan(sep))
+    np.testing.assert_allclose(fft, sep, rtol=1e-5, atol=1e-5)
+
+
+def test_out_axis_and_aliasing():
+    x = np.random.randn(400, 3)
+    expected = convolve(x, lanc(12, 1. / 40), axis=0, mode='same')
+    out = np.empty_like(x)
+    assert convolve(x, lanc(12, 1. / 40), axis=0, mode='same',
+                    out=out) is out
+    np.testing.assert_allclose(out, expected)
+
+    # In place.
+    expected = smoo2(x, 5, 3)
+    assert smoo2(x, 5, 3, out=x) is x
+    np.testing.assert_allclose(x, expected)
+
+    with pytest.raises(ValueError):
+        md_trenberth(x, axis=0, out=np.empty((400, 3)))
+    with pytest.raises(ValueError):
+        boxcar(x, 3, dtype=int)
+
+    bands = np.empty((2,) + x.shape, np.float32)
+    fft_filterbank(x, [(1. / 20, 1. / 30)], axis=0, out=bands)
+    np.testing.assert_allclose(bands.sum(axis=0), x, atol=1e-5)
+    y, idx = lanc_decimate(x.astype(np.float32), 12, 1. / 40, 10, axis=0)
+    assert y.dtype == np.float32 and y.shape == (len(idx), 3)
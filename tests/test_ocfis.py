@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+
+"""
+Test ocfis
+==========
+
+"""
+
+from __future__ import (absolute_import, division, print_function)
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from oceans.filters import medfilt1
+from oceans.ocfis import hampel, lagcorr
+
+
+def test_hampel_arrays_and_pandas():
+    rs = np.random.RandomState(20)
+    x = 10. + rs.randn(500, 3)
+    x[[50, 300], [0, 2]] = 100.
+    outliers, cleaned = hampel(x, L=11, axis=0)
+    assert outliers[50, 0] and outliers[300, 2]
+    assert np.isnan(cleaned[50, 0])
+    np.testing.assert_array_equal(cleaned[~outliers], x[~outliers])
+
+    med = medfilt1(x[:, 2], 11)
+    df = pd.DataFrame(x, columns=['a', 'b', 'c'])
+    outliers_df, cleaned_df = hampel(df, L=11, replace=True)
+    assert isinstance(cleaned_df, pd.DataFrame)
+    assert list(cleaned_df.columns) == ['a', 'b', 'c']
+    np.testing.assert_array_equal(outliers_df.values, outliers)
+    assert cleaned_df['c'][300] == med[300]
+
+    s = pd.Series(x[:, 0], name='temp')
+    outliers_s, cleaned_s = hampel(s, L=11)
+    assert cleaned_s.name == 'temp'
+    np.testing.assert_array_equal(outliers_s.values, outliers[:, 0])
+
+
+@pytest.mark.parametrize('dtype', [list, np.float32, int])
+def test_hampel_plain_inputs(dtype):
+    x = 10 * np.random.RandomState(21).randn(100)
+    x[40] = 1000.
+    x = np.round(x).astype(int)  # Exact in every dtype.
+    xin = x.tolist() if dtype is list else x.astype(dtype)
+    outliers, cleaned = hampel(xin, L=11)
+    expected, _ = hampel(x.astype(float), L=11)
+    assert isinstance(outliers, np.ndarray) and outliers[40]
+    np.testing.assert_array_equal(outliers, expected)
+    assert np.isnan(cleaned[40])
+
+
+def test_hampel_smooth_signal():
+    t = np.linspace(0, 20, 400)
+    outliers, _ = hampel(np.sin(t), L=15)
+    assert not outliers.any()
+
+    rs = np.random.RandomState(0)
+    x = np.sin(3 * t) + 0.01 * rs.randn(400)
+    x[[100, 250]] += 5.
+    outliers, _ = hampel(x, L=15)
+    np.testing.assert_array_equal(np.where(outliers)[0], [100, 250])
+
+    # Every point measured against the median of its own window.
+    expected = np.zeros(len(x), dtype=bool)
+    for i in range(len(x)):
+        w = x[max(i - 7, 0):i + 8]
+        med = np.median(w)
+        mad = 1.4826 * np.median(np.abs(w - med))
+        expected[i] = np.abs(x[i] - med) > 3 * mad
+    np.testing.assert_array_equal(outliers, expected)
+
+
+def test_hampel_spikes_next_to_gaps():
+    rs = np.random.RandomState(22)
+    x = np.sin(np.linspace(0, 10, 200)) + 0.1 * rs.randn(200)
+    x[[20, 121]] = 5.
+    x[[22, 120, 123]] = np.NaN
+    outliers, cleaned = hampel(x, L=15, replace=True)
+    assert outliers[[20, 121]].all()
+    assert np.isnan(cleaned[[22, 120, 123]]).all()
+    assert cleaned[20] == np.nanmedian(x[13:28])
+
+    expected = np.zeros(len(x), dtype=bool)
+    for i in range(len(x)):
+        w = x[max(i - 7, 0):i + 8]
+        med = np.nanmedian(w)
+        mad = 1.4826 * np.nanmedian(np.abs(w - med))
+        expected[i] = np.abs(x[i] - med) > 3 * mad
+    np.testing.assert_array_equal(outliers, expected)
+
+
+def _loop_lagcorr(x, y, M):
+    """The original, double loop, `lagcorr`."""
+    N = x.size
+    Cxy = np.zeros(M)
+    x_bar, y_bar = x.mean(), y.mean()
+    for k in range(M):
+        a = 0.
+        for i in range(N - k):
+            a = a + (y[i] - y_bar) * (x[i + k] - x_bar)
+        Cxy[k] = 1. / (N - k) * a
+    return Cxy / (np.std(y) * np.std(x))
+
+
+def test_lagcorr_matches_loop():
+    rs = np.random.RandomState(3)
+    x, y = rs.randn(2, 300).cumsum(axis=1)
+    np.testing.assert_allclose(lagcorr(x, y), _loop_lagcorr(x, y, 300),
+                               atol=1e-10)
+    np.testing.assert_allclose(lagcorr(x, y, M=40),
+                               _loop_lagcorr(x, y, 40), atol=1e-10)
+
+    # Every pair of the series of a (time, 3) and a (2, time) array.
+    X, Y = rs.randn(300, 3), rs.randn(2, 300)
+    Cxy = lagcorr(X, Y.T, M=40)
+    assert Cxy.shape == (40, 3, 2)
+    for i in range(3):
+        for j in range(2):
+            np.testing.assert_allclose(Cxy[:, i, j],
+                                       _loop_lagcorr(X[:, i], Y[j], 40),
+                                       atol=1e-10)
+    np.testing.assert_allclose(lagcorr(X.T, Y, M=40, axis=1), Cxy)
+    with pytest.raises(ValueError):
+        lagcorr(x, y, M=301)
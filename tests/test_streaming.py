@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+
+"""
+Test streaming filters
+======================
+
+"""
+
+from __future__ import (absolute_import, division, print_function)
+
+import warnings
+
+import numpy as np
+import pytest
+
+from oceans.filters import (CausalMean, CausalMedian, CausalWeim,
+                            StreamingLanczos, StreamingPL33,
+                            StreamingTrenberth, convolve, lanc,
+                            md_trenberth, pl33tn, weim)
+
+
+def _stream(sf, x, sizes, axis=-1):
+    edges = np.cumsum(sizes)[:-1]
+    return np.concatenate([sf.update(chunk) for chunk in
+                           np.split(x, edges, axis=axis)], axis=axis)
+
+
+def test_streaming_pl33_small_chunks():
+    x = np.random.RandomState(10).randn(2, 400)
+    sf = StreamingPL33(dt=2.0)
+    sizes = [1, 3, 10, 40, 2, 150, 194]  # Some shorter than the kernel.
+    np.testing.assert_array_equal(_stream(sf, x, sizes),
+                                  pl33tn(x, dt=2.0, method='direct'))
+
+
+def test_streaming_lanczos_axis():
+    x = np.random.RandomState(11).randn(900, 3)
+    sf = StreamingLanczos(48, 1. / 40, axis=0)
+    wt = lanc(48, 1. / 40)
+    np.testing.assert_array_equal(_stream(sf, x, [300, 300, 300], axis=0),
+                                  convolve(x, wt, axis=0))
+    assert sf.delay == 48
+    assert sf._tail.shape == (3, len(wt) - 1)
+
+
+def test_streaming_trenberth_reset():
+    x = np.random.RandomState(12).randn(100)
+    sf = StreamingTrenberth()
+    sf.update(x[:50])
+    sf.reset()
+    np.testing.assert_allclose(_stream(sf, x, [20, 80]), md_trenberth(x))
+
+
+def test_streaming_float32():
+    x = np.random.RandomState(14).randn(100).astype(np.float32)
+    sf = StreamingTrenberth()
+    y = [sf.update(chunk) for chunk in np.split(x, [3])]
+    assert [yi.dtype for yi in y] == [np.float32, np.float32]
+    np.testing.assert_allclose(np.concatenate(y), md_trenberth(x), rtol=1e-5)
+
+
+def test_streaming_reused_buffer():
+    x = np.random.RandomState(13).randn(100)
+    sf = StreamingTrenberth()
+    buf = np.empty(5)
+    y = []
+    for chunk in np.split(x, 20):
+        buf[:] = chunk  # A telemetry reader filling the same buffer.
+        y.append(sf.update(buf))
+    np.testing.assert_allclose(np.concatenate(y), md_trenberth(x))
+
+
+def _trailing(x, L, func):
+    """Reference: `func` of the last `L` rows of `x`, shrunk at the start."""
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        return np.array([func(x[max(i - L + 1, 0):i + 1], axis=0)
+                         for i in range(len(x))])
+
+
+def test_causal_mean_and_median_match_trailing_windows():
+    rs = np.random.RandomState(18)
+    x = rs.randn(300, 4)
+    x[rs.rand(*x.shape) > 0.9] = np.NaN
+    x[20:30, 1] = np.NaN  # Empty windows.
+    for cls, func in [(CausalMean, np.nanmean), (CausalMedian, np.nanmedian)]:
+        cf = cls(7, nchannels=4)
+        np.testing.assert_allclose(cf.update(x), _trailing(x, 7, func))
+
+
+@pytest.mark.parametrize('L', [1, 4, 9])
+def test_causal_median_ties_one_sample_at_a_time(L):
+    rs = np.random.RandomState(19)
+    x = np.round(2 * rs.randn(200, 5))  # Many ties.
+    x[rs.rand(*x.shape) > 0.7] = np.NaN
+    cm = CausalMedian(L, nchannels=5)
+    y = np.array([cm.update(v).copy() for v in x])
+    np.testing.assert_array_equal(y, _trailing(x, L, np.nanmedian))
+    cm.reset()
+    assert np.isnan(cm.update(np.NaN)).all()
+    np.testing.assert_array_equal(cm.update(3.), 3.)
+
+
+def test_causal_median_long_window():
+    # Long windows move many values per sample, see `CausalMedian`.
+    rs = np.random.RandomState(20)
+    x = rs.randn(1500, 3)
+    x[rs.rand(*x.shape) > 0.9] = np.NaN
+    x[:, 2] = np.sort(x[:, 2])[::-1]  # The largest moves.
+    cm = CausalMedian(1000, nchannels=3)
+    y = cm.update(x)
+    expected = _trailing(x[:1200], 1000, np.nanmedian)
+    np.testing.assert_array_equal(y[990:1200], expected[990:])
+    np.testing.assert_array_equal(y[-1], np.nanmedian(x[-1000:], axis=0))
+
+
+def test_causal_weim_matches_weim():
+    rs = np.random.RandomState(21)
+    x = rs.randn(200, 2)
+    x[[50, 120], [0, 1]] = np.NaN
+    x[80, 0] = -9999
+    cw = CausalWeim(11, kind='hamming', nchannels=2)
+    y = cw.update(x)
+    expected = weim(x, 11, kind='hamming', axis=0)
+    np.testing.assert_allclose(y[10:], expected[5:-5])
+    assert np.isnan(y[[55, 125], [0, 1]]).all()
+
+
+@pytest.mark.parametrize('cls', [CausalMean, CausalMedian, CausalWeim])
+def test_causal_float32(cls):
+    rs = np.random.RandomState(22)
+    x = rs.randn(100, 3)
+    x[rs.rand(*x.shape) > 0.9] = np.NaN
+    expected = cls(7, nchannels=3).update(x)
+    cf = cls(7, nchannels=3, dtype=np.float32)
+    y = cf.update(x)
+    assert y.dtype == np.float32 and cf.output.dtype == np.float32
+    np.testing.assert_allclose(y, expected, rtol=1e-5, atol=1e-6)
+    assert cf.update(1.).dtype == np.float32
+
+
+def test_causal_weim_checks_window():
+    with pytest.raises(ValueError):
+        CausalWeim(4)
+    with pytest.raises(ValueError):
+        CausalWeim(5, kind='triangle')
+
+
+def test_causal_update_scalars_reuses_output():
+    cw = CausalWeim(5, kind='hamming', nchannels=3)
+    out = cw.update(1.)
+    assert cw.update([2., -9999, np.NaN]) is out
+    w = np.hamming(5)
+    np.testing.assert_allclose(out, [(w[3] + 2 * w[4]) / (w[3] + w[4]), 1, 1])
+    cw.reset()
+    assert np.isnan(cw.output).all()
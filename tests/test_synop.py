@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+
+"""
+Test synop
+==========
+
+"""
+
+from __future__ import (absolute_import, division, print_function)
+
+import numpy as np
+import pytest
+
+from oceans.ocfis import (ObjectiveAnalysis, scaloa, scaloa_local,
+                          scaloa_tiled)
+
+
+def _stations(n=200, seed=0):
+    rs = np.random.RandomState(seed)
+    x, y = 10 * rs.rand(n), 10 * rs.rand(n)
+    t = np.sin(x) + np.cos(y) + 0.05 * rs.randn(n)
+    xc, yc = np.meshgrid(np.linspace(0, 10, 41), np.linspace(0, 10, 31))
+    return xc.ravel(), yc.ravel(), x, y, t
+
+
+def _dense_scaloa(xc, yc, x, y, t, corrlen, err):
+    """The original, tiled, implementation of `scaloa`."""
+    d2 = (x[:, None] - x) ** 2 + (y[:, None] - y) ** 2
+    dc2 = (xc[:, None] - x) ** 2 + (yc[:, None] - y) ** 2
+    A = (1 - err) * np.exp(-d2 / corrlen ** 2) + err * np.eye(len(x))
+    C = (1 - err) * np.exp(-dc2 / corrlen ** 2)
+    tp = np.dot(C, np.linalg.solve(A, t))
+    ep = 1 - np.sum(C.T * np.linalg.solve(A, C.T), axis=0) / (1 - err)
+    return tp, ep
+
+
+def test_scaloa_matches_dense():
+    xc, yc, x, y, t = _stations()
+    tp0, ep0 = _dense_scaloa(xc, yc, x, y, t, 1.5, 0.1)
+    for blocksize in [4096, 100, 7]:
+        tp, ep = scaloa(xc, yc, x, y, t=t, corrlen=1.5, err=0.1,
+                        blocksize=blocksize)
+        assert tp.shape == (len(xc), 1)
+        np.testing.assert_allclose(tp[:, 0], tp0, atol=1e-10)
+        np.testing.assert_allclose(ep, ep0, atol=1e-10)
+
+    tp, ep = scaloa(xc, yc, x, y, corrlen=1.5, err=0.1)
+    assert tp is None
+    np.testing.assert_allclose(ep, ep0, atol=1e-10)
+
+
+def test_objective_analysis_many_fields():
+    xc, yc, x, y, t = _stations()
+    fields = np.c_[t, 2 * t + 1, np.cos(x)]
+    tp0 = np.column_stack([_dense_scaloa(xc, yc, x, y, f, 1.5, 0.1)[0]
+                           for f in fields.T])
+    ep0 = _dense_scaloa(xc, yc, x, y, t, 1.5, 0.1)[1]
+
+    for cachesize in [0, 2 ** 28]:
+        oa = ObjectiveAnalysis(xc, yc, x, y, corrlen=1.5, err=0.1,
+                               blocksize=100, cachesize=cachesize)
+        np.testing.assert_allclose(oa.map(fields), tp0, atol=1e-10)
+        np.testing.assert_allclose(oa.ep, ep0, atol=1e-10)
+        # Cached blocks are not overwritten by the error computation.
+        np.testing.assert_allclose(oa.map(t), tp0[:, 0], atol=1e-10)
+
+    with pytest.raises(ValueError):
+        oa.map(t[:-1])
+
+
+def test_scaloa_duplicated_stations():
+    # With err=0 the near duplicate stations make A singular to machine
+    # precision, where the Cholesky factorization fails.
+    xc, yc, x, y, t = _stations(100)
+    x, y, t = np.r_[x, x[:20] + 1e-9], np.r_[y, y[:20]], np.r_[t, t[:20]]
+    oa = ObjectiveAnalysis(x, y, x, y, corrlen=1.5, err=0.)
+    assert oa.L is None
+
+    # Without sampling error the analysis interpolates the observations.
+    tp, ep = scaloa(x, y, x, y, t=t, corrlen=1.5, err=0.)
+    np.testing.assert_allclose(tp[:, 0], t, atol=1e-5)
+    np.testing.assert_allclose(ep, 0, atol=1e-10)
+
+    tp, ep = scaloa(xc, yc, x, y, t=t, corrlen=1.5, err=0.)
+    for processes in [1, 2]:
+        tpt, ept = scaloa_tiled(xc, yc, x, y, t=t, corrlen=1.5, err=0.,
+                                tile=300, processes=processes)
+        np.testing.assert_allclose(tpt, tp, atol=1e-10)
+        np.testing.assert_allclose(ept, ep, atol=1e-10)
+
+    # The local systems fail the same way.
+    tp, ep = scaloa_local(x, y, x, y, t=t, corrlen=1.5, err=0., k=30)
+    np.testing.assert_allclose(tp[:, 0], t, atol=1e-5)
+    np.testing.assert_allclose(ep, 0, atol=1e-10)
+
+    tp, ep = scaloa_local(xc, yc, x, y, t=t, corrlen=1.5, err=0., k=30,
+                          radius=3.)
+    assert np.all((ep > 0) & (ep < 1))
+    for processes in [1, 2]:
+        tpt, ept = scaloa_tiled(xc, yc, x, y, t=t, corrlen=1.5, err=0.,
+                                tile=300, processes=processes, k=30,
+                                radius=3.)
+        np.testing.assert_allclose(tpt, tp, atol=1e-10)
+        np.testing.assert_allclose(ept, ep, atol=1e-10)
+
+
+def test_scaloa_local():
+    xc, yc, x, y, t = _stations()
+    tp0, ep0 = _dense_scaloa(xc, yc, x, y, t, 1.5, 0.1)
+
+    # All the observations as neighbours is the global analysis.
+    for kw in [dict(k=len(x)), dict(k=None, radius=100.)]:
+        tp, ep = scaloa_local(xc, yc, x, y, t=t, corrlen=1.5, err=0.1,
+                              blocksize=100, **kw)
+        assert tp.shape == (len(xc), 1)
+        np.testing.assert_allclose(tp[:, 0], tp0, atol=1e-10)
+        np.testing.assert_allclose(ep, ep0, atol=1e-10)
+
+    tp, ep = scaloa_local(xc, yc, x, y, t=np.c_[t, 2 * t], corrlen=1.5,
+                          err=0.1, k=50, radius=3.)
+    assert tp.shape == (len(xc), 2)
+    np.testing.assert_allclose(tp[:, 1], 2 * tp[:, 0])
+    assert np.abs(tp[:, 0] - tp0).max() < 0.1
+    assert np.abs(ep - ep0).max() < 0.01
+
+    # No neighbours: the mean field and no error reduction.
+    tp, ep = scaloa_local([50.], [50.], x, y, t=t, corrlen=1.5, err=0.1,
+                          k=None, radius=2.)
+    assert tp[0, 0] == 0 and ep[0] == 1
+
+
+@pytest.mark.parametrize('processes', [1, 2])
+def test_scaloa_tiled(processes):
+    xc, yc, x, y, t = _stations()
+    tp0, ep0 = scaloa(xc, yc, x, y, t=t, corrlen=1.5, err=0.1)
+    tp, ep = scaloa_tiled(xc, yc, x, y, t=t, corrlen=1.5, err=0.1, tile=300,
+                          processes=processes, blocksize=128)
+    np.testing.assert_allclose(tp, tp0, atol=1e-10)
+    np.testing.assert_allclose(ep, ep0, atol=1e-10)
+
+    tp, ep = scaloa_tiled(xc, yc, x, y, corrlen=1.5, err=0.1, tile=300,
+                          processes=processes)
+    assert tp is None
+    np.testing.assert_allclose(ep, ep0, atol=1e-10)
+
+    fields = np.c_[t, np.cos(x)]
+    tpl, epl = scaloa_local(xc, yc, x, y, t=fields, corrlen=1.5, err=0.1,
+                            k=40, radius=2.)
+    tp, ep = scaloa_tiled(xc, yc, x, y, t=fields, corrlen=1.5, err=0.1,
+                          tile=300, processes=processes, k=40, radius=2.)
+    np.testing.assert_allclose(tp, tpl, atol=1e-12)
+    np.testing.assert_allclose(ep, epl, atol=1e-12)